@@ -1,38 +1,54 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
-from io import StringIO
+from hsp_clean import format_cdt_first, rows_after_user_service_id
+from hsp_parallel import merge_by_user_service_id, read_file
+from hsp_profile import make_profiler, profile_panel, profile_toggle
+from upload_cache import process_uploads
 
 st.set_page_config(page_title="پردازش فایل CSV خدمات کاربران", layout="wide")
 
 st.title("🧾 برنامه پردازش گزارش خدمات کاربران")
 
-uploaded_file = st.file_uploader("📤 فایل CSV را آپلود کنید", type=["csv"])
+profiler = make_profiler(profile_toggle())
 
-if uploaded_file:
-    df = pd.read_csv(uploaded_file)
-    
-    st.success("✅ فایل با موفقیت خوانده شد.")
-    st.write("پیش‌نمایش فایل اصلی:", df.head())
+uploaded_files = st.file_uploader("📤 فایل‌های CSV را آپلود کنید", type=["csv"], accept_multiple_files=True)
+
+if uploaded_files:
+    # هر فایل در یک پروسه جدا خوانده و ستون‌های اضافه‌اش حذف می‌شود (فایل‌هایی که قبلاً
+    # خوانده شده‌اند از کش)؛ چند فایل به ترتیب UserServiceId ادغام می‌شوند
+    frames = []
+    with profiler.stage("read_csv") as record:
+        for name, result, error in process_uploads(read_file, uploaded_files):
+            if error is not None:
+                st.error(f"❌ خطا در خواندن فایل {name}: {error}")
+                continue
+            rows, df_file = result
+            st.success(f"✅ فایل {name} با موفقیت خوانده شد ({rows} ردیف).")
+            frames.append(df_file)
+        record["rows_out"] = sum(len(df_file) for df_file in frames)
+    if not frames:
+        st.stop()
+    if len(frames) == 1:
+        df = frames[0]
+    else:
+        df, duplicates = profiler.run("merge_files", merge_by_user_service_id, frames)
+        if duplicates:
+            st.info(f"{duplicates} ردیف تکراری بین فایل‌ها حذف شد.")
+    del frames
 
-    # حذف ستون‌ها
-    columns_to_drop = [
-        'PayPlan', 'DirectOff', 'VAT', 'PayPrice', 'Off', 'SavingOff', 'CancelDT',
-        'ReturnPrice', 'InstallmentNo', 'InstallmentPeriod', 'InstallmentFirstCash', 'ServiceIsDel'
-    ]
-    df = df.drop(columns=[col for col in columns_to_drop if col in df.columns])
+    st.write("پیش‌نمایش فایل اصلی:", df.head())
 
     # دریافت UserServiceId از کاربر
     user_input = st.number_input("🔢 لطفاً شماره UserServiceId را وارد کنید:", min_value=1, step=1)
+    lower_bound = st.checkbox("اگر این شماره در فایل نبود، از اولین UserServiceId بزرگ‌تر ادامه بده (فایل مرتب)")
 
     if st.button("🚀 پردازش فایل"):
         # حذف ردیف‌ها تا و شامل UserServiceId
-        index_target = df.index[df['UserServiceId'] == user_input].tolist()
-        if not index_target:
+        df_after = profiler.run("cutoff", rows_after_user_service_id, df, user_input, lower_bound=lower_bound)
+        if df_after is None:
             st.error(f"UserServiceId برابر {user_input} پیدا نشد.")
         else:
-            start_index = index_target[0] + 1
-            df = df.loc[start_index:].reset_index(drop=True)
+            df = df_after
             st.info(f"تمام ردیف‌های قبل و شامل UserServiceId={user_input} حذف شدند.")
 
             # پاک‌سازی مقادیر
@@ -42,29 +58,21 @@ if uploaded_file:
                 df['SavingOffUsed'] = np.nan
 
             # فرمت‌دهی تاریخ CDT
-            def format_gregorian_date_str(date_str):
-                try:
-                    date_part = str(date_str).split(' ')[0]
-                    date = pd.to_datetime(date_part, errors='coerce')
-                    return date.strftime('%Y-%m-%d') if pd.notnull(date) else None
-                except:
-                    return None
-
-            if 'CDT' in df.columns:
-                df['CDT'] = df['CDT'].apply(format_gregorian_date_str)
-                cols = list(df.columns)
-                cols.insert(0, cols.pop(cols.index('CDT')))
-                df = df[cols]
+            df = profiler.run("format_cdt", format_cdt_first, df)
 
             # نمایش و ذخیره نهایی
             st.success("✅ فایل با موفقیت پردازش شد.")
             st.write("پیش‌نمایش خروجی:", df.head())
 
             # دانلود فایل نهایی
-            csv = df.to_csv(index=False, encoding='utf-8-sig')
+            with profiler.stage("to_csv", len(df)):
+                csv = df.to_csv(index=False, encoding='utf-8-sig')
             st.download_button(
                 label="📥 دانلود فایل نهایی CSV",
                 data=csv,
                 file_name='final_output.csv',
                 mime='text/csv'
             )
+
+profile_panel(profiler.summary())
+profiler.dump()
@@ -1,35 +1,29 @@
 import streamlit as st
 import pandas as pd
-import jdatetime
-import datetime
-import numpy as np
-from google.cloud import bigquery
+from bq_client import TABLE_NAMES, get_client, get_watermark, table_path_for, watermark_panel
+from bq_metrics import metrics_panel
+from hsp_profile import make_profiler, profile_panel, profile_toggle
+from hsp_reader import read_export
+from upload_cache import cached_clean_export, cached_read_export
 import io
 
 st.set_page_config(page_title="Service Report Processor", layout="centered")
 st.title("📊 کار رو به کاردان بسپار")
 
 # اتصال به BigQuery
-credentials_info = dict(st.secrets["gcp_service_account"])
-client = bigquery.Client.from_service_account_info(credentials_info)
+client = get_client()
+metrics_panel()
+profiler = make_profiler(profile_toggle())
 
-table_names = [
-    "hspdata",
-    "hspdata_02",
-    "hspdata_ghor",
-    "hspdata_ac",
-    "test"
-]
+watermark_panel(client)
 
-selected_table_name = st.selectbox("✅ نام جدول را انتخاب کنید", table_names)
+selected_table_name = st.selectbox("✅ نام جدول را انتخاب کنید", TABLE_NAMES)
 
 max_usv = 0
 if selected_table_name:
-    table_path = f"frsphotspots.HSP.{selected_table_name}"
-    query = f"SELECT MAX(UserServiceId) as max_usv FROM `{table_path}`"
+    table_path = table_path_for(selected_table_name)
     try:
-        result = client.query(query).result()
-        max_usv = next(result)['max_usv'] or 0
+        max_usv = get_watermark(client, table_path)
     except Exception as e:
         st.error(f"خطا در دریافت بزرگ‌ترین UserServiceId: {e}")
         max_usv = 0
@@ -43,78 +37,15 @@ if 'cleaned_df' not in st.session_state:
     st.session_state['cleaned_df'] = pd.DataFrame()
 
 if uploaded_file is not None:
-    df_raw = pd.read_csv(uploaded_file)
+    # خواندن و پاک‌سازی با هش محتوای فایل کش می‌شوند و در rerunها تکرار نمی‌شوند
+    read = lambda f: profiler.run("read_csv", read_export, f)
+    df_raw = cached_read_export(uploaded_file, read)
     st.write("🗂️ پیش‌نمایش داده‌های خام (۱۰ سطر اول):")
     st.dataframe(df_raw.head(10))
 
     if st.button("🧹 Clean Data"):
-        columns_to_drop = [
-            'PayPlan', 'DirectOff', 'VAT', 'PayPrice', 'Off', 'SavingOff',
-            'CancelDT', 'ReturnPrice', 'InstallmentNo', 'InstallmentPeriod',
-            'InstallmentFirstCash', 'ServiceIsDel'
-        ]
-        df_clean = df_raw.drop(columns=columns_to_drop, errors='ignore')
-
-        # انتقال ستون تاریخ "CDT" به ابتدای جدول (اگر وجود داشت)
-        cols = list(df_clean.columns)
-        if "CDT" in cols:
-            cols.insert(0, cols.pop(cols.index("CDT")))
-            df_clean = df_clean[cols]
-
-        # تغییر نام ستون‌ها طبق اسکیم
-        new_columns = [
-            "CreatDate",
-            "UserServiceId",
-            "Creator",
-            "ServiceName",
-            "Username",
-            "ServiceStatus",
-            "ServicePrice",
-            "Package",
-            "StartDate",
-            "EndDate"
-        ]
-        df_clean.columns = new_columns[:len(df_clean.columns)]
-
-        # فقط بخش تاریخ را نگه‌دار
-        df_clean['CreatDate'] = df_clean['CreatDate'].astype(str).str.split().str[0]
-
-        # تابع تبدیل تاریخ به میلادی
-        def to_gregorian_if_jalali(date_str):
-            try:
-                if not isinstance(date_str, str):
-                    return date_str
-                if date_str.startswith('14'):
-                    parts = date_str.replace('-', '/').split('/')
-                    if len(parts) == 3:
-                        jy, jm, jd = map(int, parts)
-                        gdate = jdatetime.date(jy, jm, jd).togregorian()
-                        return gdate.strftime('%Y-%m-%d')
-                elif date_str.startswith('20'):
-                    parts = date_str.replace('-', '/').split('/')
-                    if len(parts) == 3:
-                        gy, gm, gd = map(int, parts)
-                        return datetime.date(gy, gm, gd).strftime('%Y-%m-%d')
-                return date_str
-            except Exception:
-                return date_str
-
-        df_clean['CreatDate'] = df_clean['CreatDate'].apply(to_gregorian_if_jalali)
-
-        # مقادیر ستون‌های ServicePrice و Package کاملاً خالی
-        df_clean['ServicePrice'] = np.nan
-        df_clean['Package'] = np.nan
-
-        # خالی‌سازی رشته‌ای‌ها در صورت نیاز
-        for col in ['Creator', 'ServiceName', 'Username', 'ServiceStatus', 'StartDate', 'EndDate']:
-            df_clean[col] = df_clean[col].replace({None: '', 'None': '', 'nan': '', 'NaN': '', np.nan: ''})
-
-        # فیلتر کردن UserServiceId
-        try:
-            df_clean['UserServiceId'] = pd.to_numeric(df_clean['UserServiceId'], errors='coerce')
-            df_clean = df_clean[df_clean['UserServiceId'] > max_usv].reset_index(drop=True)
-        except Exception:
-            st.warning("⚠️ خطا در تبدیل یا فیلتر کردن UserServiceId. لطفاً صحت داده‌ها را بررسی کنید.")
+        # همان مراحل پاک‌سازی bq_api_update.py
+        df_clean = cached_clean_export(uploaded_file, max_usv, read, clean=profiler.clean_frame)
 
         # ذخیره در session_state
         st.session_state['cleaned_df'] = df_clean
@@ -134,5 +65,5 @@ if not st.session_state['cleaned_df'].empty:
         mime="text/csv"
     )
 
-
-
+profile_panel(profiler.summary())
+profiler.dump()
@@ -0,0 +1,46 @@
+# مقایسه سرعت تبدیل تاریخ CreatDate: نسخه سطر به سطر در برابر نسخه برداری
+# اجرا از ریشه مخزن:  python -m benchmarks.bench_jalali --rows 500000
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from jalali_dates import convert_jalali_series, to_gregorian_if_jalali
+
+
+def make_dates(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    jy = rng.integers(1400, 1405, rows)
+    jm = rng.integers(1, 13, rows)
+    jd = rng.integers(1, 30, rows)
+    gregorian = pd.Timestamp('2021-03-21') + pd.to_timedelta(rng.integers(0, 1800, rows), unit='D')
+    jalali = pd.Series(jy.astype(str)) + '/' + pd.Series(jm.astype(str)) + '/' + pd.Series(jd.astype(str))
+    mixed = jalali.where(rng.random(rows) < 0.7, pd.Series(gregorian.strftime('%Y-%m-%d')))
+    return mixed.astype(object)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500_000)
+    args = parser.parse_args()
+
+    dates = make_dates(args.rows)
+    legacy, legacy_sec = timed(dates.apply, to_gregorian_if_jalali)
+    vector, vector_sec = timed(convert_jalali_series, dates)
+    assert legacy.equals(vector), "خروجی دو روش یکسان نیست"
+
+    print(f"rows={args.rows}")
+    print(f"apply(to_gregorian_if_jalali): {legacy_sec:.3f}s")
+    print(f"convert_jalali_series:         {vector_sec:.3f}s")
+    print(f"speedup: {legacy_sec / vector_sec:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
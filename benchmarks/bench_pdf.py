@@ -0,0 +1,42 @@
+# زمان و حجم خروجی موتور PDF برای گزارش‌های با اندازه‌های مختلف
+# اجرا از ریشه مخزن:  python -m benchmarks.bench_pdf --rows 10000 100000 1000000
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from pdf_export import render_pdf
+
+
+def make_report_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    creators = np.array([f"creator_{i}" for i in range(50)])
+    services = np.array([f"Service {i} GB" for i in range(30)])
+    dates = pd.Timestamp('2024-03-20') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D')
+    return pd.DataFrame({
+        "CreatDate": dates.date,
+        "UserServiceId": np.arange(5_000_000, 5_000_000 + rows),
+        "Creator": creators[rng.integers(0, len(creators), rows)],
+        "ServiceName": services[rng.integers(0, len(services), rows)],
+        "Username": pd.Series(rng.integers(0, 10**8, rows)).map("u{}".format),
+        "ServiceStatus": np.where(rng.random(rows) < 0.9, "Active", "Cancel"),
+        "Package": rng.integers(1, 50, rows) * 10000.0,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        df = make_report_frame(rows)
+        start = time.perf_counter()
+        pdf_bytes = render_pdf(df)
+        elapsed = time.perf_counter() - start
+        print(f"rows={rows:<9} {elapsed:8.2f}s {len(pdf_bytes) / 2**20:9.2f} MiB {rows / elapsed:10.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# مقایسه حجم و زمان آماده‌سازی داده ارسالی: CSV با تبدیل رشته‌ای قدیمی در برابر Parquet فشرده
+# اجرا از ریشه مخزن:  python -m benchmarks.bench_upload_encoding --rows 500000
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from hsp_parquet import write_parquet
+from hsp_schema import STRING_COLUMNS
+
+
+def make_clean_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    creators = np.array([f"creator_{i}" for i in range(300)])
+    services = np.array([f"service_{i}" for i in range(40)])
+    dates = pd.Timestamp('2023-03-21') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D')
+    return pd.DataFrame({
+        "CreatDate": dates.strftime('%Y-%m-%d'),
+        "UserServiceId": np.arange(1_000_000, 1_000_000 + rows),
+        "Creator": creators[rng.zipf(1.5, rows) % len(creators)],
+        "ServiceName": services[rng.integers(0, len(services), rows)],
+        "Username": pd.Series(rng.integers(0, 10**9, rows)).map("u{}".format),
+        "ServiceStatus": np.where(rng.random(rows) < 0.9, "Active", "Cancel"),
+        "ServicePrice": np.nan,
+        "Package": np.nan,
+        "StartDate": dates.strftime('%Y-%m-%d 00:00:00'),
+        "EndDate": (dates + pd.Timedelta(days=30)).strftime('%Y-%m-%d 00:00:00'),
+    })
+
+
+def legacy_csv(df_clean, path):
+    # مسیر قبلی: تبدیل همه ستون‌های رشته‌ای با astype(str) و سپس سریال‌سازی
+    df = df_clean.copy()
+    df['CreatDate'] = pd.to_datetime(df['CreatDate'], errors='coerce').dt.date
+    df['UserServiceId'] = pd.to_numeric(df['UserServiceId'], errors='coerce').astype('Int64')
+    for col in STRING_COLUMNS:
+        df[col] = df[col].astype(str)
+    df.to_csv(path, index=False)
+
+
+def measure(name, func, df_clean, path):
+    start = time.perf_counter()
+    func(df_clean, path)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {elapsed:8.3f}s {os.path.getsize(path) / 2**20:10.2f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500_000)
+    args = parser.parse_args()
+
+    df_clean = make_clean_frame(args.rows)
+    print(f"rows={args.rows}")
+    with tempfile.TemporaryDirectory() as tmp:
+        measure("csv", legacy_csv, df_clean, os.path.join(tmp, "upload.csv"))
+        measure("parquet", write_parquet, df_clean, os.path.join(tmp, "upload.parquet"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+# مقایسه دو فایل نتایج run_pipeline (مثلاً دو commit مختلف)
+# اجرا از ریشه مخزن:  python -m benchmarks.compare old.json new.json
+import argparse
+import json
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report, {(r["rows"], r["stage"]): r for r in report["results"]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base')
+    parser.add_argument('new')
+    args = parser.parse_args()
+
+    base_report, base = load(args.base)
+    new_report, new = load(args.new)
+    print(f"base={base_report.get('commit')}  new={new_report.get('commit')}")
+    print(f"{'rows':>9} {'stage':<24} {'base':>10} {'new':>10} {'ratio':>7} {'peak base':>10} {'peak new':>10}")
+    for key in sorted(set(base) | set(new)):
+        b, n = base.get(key), new.get(key)
+        b_wall = b["wall_s"] if b else None
+        n_wall = n["wall_s"] if n else None
+        ratio = f"{n_wall / b_wall:6.2f}x" if b_wall and n_wall else "-"
+        fmt = lambda v, unit: f"{v:.3f}{unit}" if v is not None else "-"
+        print(f"{key[0]:>9} {key[1]:<24} {fmt(b_wall, 's'):>10} {fmt(n_wall, 's'):>10} {ratio:>7} "
+              f"{fmt(b and b['peak_mib'], ''):>10} {fmt(n and n['peak_mib'], ''):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+# بنچمارک سرتاسری: تولید داده مصنوعی، خواندن CSV، مراحل پاک‌سازی، آپلود (به جایگزین محلی)،
+# ساخت Pivot و خروجی PDF. زمان و حافظه هر مرحله جداگانه اندازه‌گیری و در JSON ذخیره می‌شود.
+# اجرا از ریشه مخزن:
+#   python -m benchmarks.run_pipeline --rows 10000 100000 1000000 --output bench_results.json
+#   python -m benchmarks.compare old.json new.json
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+import local_mirror
+from benchmarks.local_bigquery import LocalBigQueryClient
+from benchmarks.synthetic import write_raw_csv
+from bq_client import get_watermark
+from bq_fetch import fetch_dataframe
+from hsp_clean import clean_stages, format_cdt_first, rows_after_user_service_id
+from hsp_parquet import to_arrow_table, write_parquet
+from hsp_profile import rss_bytes
+from hsp_reader import read_export
+from hsp_tables import table_path_for
+from pdf_export import render_pdf
+from report_queries import RAW_MEASURES, ReportFilters, build_pivot_query
+
+TABLE_PATH = "local.HSP.hspdata"
+
+# جدول نسخه محلی (local_mirror) که کوئری‌های گزارش روی آن اجرا می‌شوند
+MIRROR_TABLE = "hspdata"
+
+
+class RssSampler:
+    # بیشینه RSS پروسه در طول یک مرحله، با نمونه‌برداری در یک thread جدا؛ حافظه
+    # native (numpy / Arrow) را هم می‌بیند و برخلاف tracemalloc سرعت کد را کم نمی‌کند
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_rss = self.peak_rss = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = rss_bytes()
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss, rss)
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = rss_bytes()
+        if self.start_rss is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start_rss is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+
+    @property
+    def peak_delta(self):
+        return None if self.start_rss is None else self.peak_rss - self.start_rss
+
+
+class StageRecorder:
+    def __init__(self, rows, use_tracemalloc=False):
+        self.rows = rows
+        self.use_tracemalloc = use_tracemalloc
+        self.results = []
+
+    def run(self, name, func, *args, **kwargs):
+        rows_in = next((len(a) for a in args if isinstance(a, pd.DataFrame)), None)
+        if self.use_tracemalloc:
+            tracemalloc.start()
+        with RssSampler() as sampler:
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            out = func(*args, **kwargs)
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        peak = sampler.peak_delta
+        if self.use_tracemalloc:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        result = {
+            "rows": self.rows,
+            "stage": name,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "peak_mib": round(peak / 2**20, 3) if peak is not None else None,
+            "rows_in": rows_in,
+            "rows_out": len(out) if isinstance(out, pd.DataFrame) else None,
+        }
+        self.results.append(result)
+        print(f"{self.rows:>9} {name:<24} {wall:9.3f}s {cpu:9.3f}s "
+              f"{'' if peak is None else f'{peak / 2**20:9.1f} MiB'}")
+        return out
+
+
+def _upload(client, df_clean):
+    buffer = io.BytesIO()
+    write_parquet(df_clean, buffer)
+    buffer.seek(0)
+    client.load_table_from_file(buffer, TABLE_PATH).result()
+    return buffer.getbuffer().nbytes
+
+
+class _CleanTable:
+    # منبع همگام‌سازی نسخه محلی: همان ردیف‌های پاک‌شده (به جای کوئری BigQuery)
+
+    def __init__(self, df_clean):
+        self.table = to_arrow_table(df_clean)
+
+    def query_arrow(self, query, params=()):
+        return self.table
+
+
+def _sync_mirror(df_clean, root):
+    local_mirror.sync_table(_CleanTable(df_clean), MIRROR_TABLE, root)
+    return local_mirror.MirrorBackend(root, [MIRROR_TABLE])
+
+
+def _pivot(mirror, filters):
+    # همان کوئری ROLLUP گزارش Pivot (report_queries.build_pivot_query) روی جدول خام، با موتور نسخه محلی
+    where_clause, params = filters.where()
+    query = build_pivot_query(filters.table_path, where_clause, RAW_MEASURES, per_creator=True)
+    pivot_df = fetch_dataframe(mirror, query, params)
+    return pivot_df.drop(columns=['is_total']), pivot_df['is_total'].astype(bool).tolist()
+
+
+def _render_pivot(pivot):
+    pivot_df, total_rows = pivot
+    return render_pdf(pivot_df, total_rows=total_rows)
+
+
+def run_size(rows, workdir, args):
+    recorder = StageRecorder(rows, use_tracemalloc=args.tracemalloc)
+    csv_path = os.path.join(workdir, f"raw_{rows}.csv")
+    recorder.run("generate_csv", write_raw_csv, rows, csv_path, seed=args.seed)
+
+    df_raw = recorder.run("read_csv", read_export, csv_path)
+
+    # مسیر bq_api_update.py / app_pd.py
+    client = LocalBigQueryClient(os.path.join(workdir, f"bq_{rows}"))
+    max_usv = recorder.run("watermark", get_watermark, client, TABLE_PATH, ttl=0)
+    df_clean = df_raw
+    for name, stage in clean_stages(max_usv):
+        df_clean = recorder.run(f"clean.{name}", stage, df_clean)
+    recorder.run("upload_parquet", _upload, client, df_clean)
+
+    # مسیر App.py
+    if not args.skip_app:
+        df_app = df_raw.copy()
+        cutoff_id = int(df_app['UserServiceId'].iloc[len(df_app) // 2])
+        df_app = recorder.run("app.cutoff", rows_after_user_service_id, df_app, cutoff_id)
+        recorder.run("app.format_cdt", format_cdt_first, df_app)
+
+    # گزارش‌ها: کوئری واقعی Pivot روی نسخه محلی (duckdb)؛ بدون duckdb این مراحل اجرا نمی‌شوند
+    if local_mirror.HAS_DUCKDB:
+        mirror = recorder.run("mirror.sync", _sync_mirror, df_clean, os.path.join(workdir, f"mirror_{rows}"))
+        filters = ReportFilters.create(table_path_for(MIRROR_TABLE), df_clean['Creator'].dropna().unique())
+        pivot = recorder.run("pivot_rollup", _pivot, mirror, filters)
+        recorder.run("pdf.pivot", _render_pivot, pivot)
+    report_rows = df_clean.head(args.pdf_rows)
+    recorder.run("pdf.report", render_pdf, report_rows)
+
+    client.close()
+    return recorder.results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pdf-rows', type=int, default=100_000, help="سقف ردیف‌های گزارش PDF")
+    parser.add_argument('--skip-app', action='store_true', help="بدون مراحل App.py (format_cdt سطر به سطر است)")
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help="حافظه با tracemalloc (فقط تخصیص‌های پایتون، کندتر) به جای RSS")
+    parser.add_argument('--output', help="مسیر فایل JSON نتایج")
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'stage':<24} {'wall':>10} {'cpu':>10} {'peak':>13}")
+    results = []
+    with tempfile.TemporaryDirectory(prefix="hsp_bench_") as workdir:
+        for rows in args.rows:
+            results += run_size(rows, workdir, args)
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "memory": "tracemalloc" if args.tracemalloc else "rss_delta",
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+        print(f"نتایج در {args.output} ذخیره شد.")
+
+
+if __name__ == '__main__':
+    main()
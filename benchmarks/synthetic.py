@@ -0,0 +1,77 @@
+# تولید خروجی خام مصنوعی HSP، با همان ستون‌های فایل‌های ارسالی شعب
+import datetime
+
+import jdatetime
+import numpy as np
+import pandas as pd
+
+# ترتیب ستون‌های خروجی خام سامانه؛ بعد از حذف ستون‌های اضافه و انتقال CDT
+# به ابتدا، با NEW_COLUMNS جدول هم‌ترتیب می‌شود (SavingOffUsed جای Package است)
+RAW_COLUMNS = [
+    'UserServiceId', 'Creator', 'ServiceName', 'Username', 'ServiceStatus',
+    'ServicePrice', 'PayPlan', 'DirectOff', 'VAT', 'PayPrice', 'Off', 'SavingOff',
+    'SavingOffUsed', 'CDT', 'CancelDT', 'ReturnPrice', 'InstallmentNo',
+    'InstallmentPeriod', 'InstallmentFirstCash', 'StartDate', 'EndDate', 'ServiceIsDel'
+]
+
+FIRST_DAY = datetime.date(2023, 3, 21)
+DAYS = 730
+
+
+def _day_strings():
+    days = [FIRST_DAY + datetime.timedelta(days=i) for i in range(DAYS)]
+    gregorian = np.array([d.strftime('%Y-%m-%d') for d in days], dtype=object)
+    jalali = np.array([jdatetime.date.fromgregorian(date=d).strftime('%Y/%m/%d') for d in days], dtype=object)
+    return gregorian, jalali
+
+
+def make_raw_export(rows, seed=0, jalali_share=0.7, creators=2000, first_id=10_000_000):
+    # Creatorها با توزیع zipf انتخاب می‌شوند تا چند Creator بزرگ و تعداد زیادی کوچک داشته باشیم
+    rng = np.random.default_rng(seed)
+    creator_names = np.array([f"branch{i // 50:02d}_user{i:04d}" for i in range(creators)], dtype=object)
+    services = np.array(
+        [f"{size}GB {period} Day" for size in (5, 10, 20, 50, 100) for period in (7, 30, 90)] + ["Unlimited 30 Day"],
+        dtype=object
+    )
+    gregorian, jalali = _day_strings()
+
+    day_idx = np.sort(rng.integers(0, DAYS, rows))
+    use_jalali = rng.random(rows) < jalali_share
+    seconds = pd.Series(rng.integers(0, 86400, rows))
+    clock = (" " + (seconds // 3600).astype(str).str.zfill(2) + ":" + (seconds % 3600 // 60).astype(str).str.zfill(2)
+             + ":" + (seconds % 60).astype(str).str.zfill(2))
+    cdt = pd.Series(np.where(use_jalali, jalali[day_idx], gregorian[day_idx])) + clock
+    start = pd.Series(gregorian[day_idx]) + " 00:00:00"
+    end = pd.Series(gregorian[np.minimum(day_idx + 30, DAYS - 1)]) + " 00:00:00"
+    price = rng.integers(1, 60, rows) * 50_000.0
+
+    df = pd.DataFrame({
+        'UserServiceId': first_id + np.arange(rows),
+        'Creator': creator_names[np.minimum(rng.zipf(1.3, rows) - 1, creators - 1)],
+        'ServiceName': services[rng.integers(0, len(services), rows)],
+        'Username': "user" + pd.Series(rng.integers(10**6, 10**8, rows)).astype(str),
+        'ServiceStatus': np.where(rng.random(rows) < 0.92, "Active", "Cancel"),
+        'ServicePrice': price,
+        'PayPlan': np.where(rng.random(rows) < 0.8, "PrePaid", "Installment"),
+        'DirectOff': 0,
+        'VAT': price * 0.1,
+        'PayPrice': price * 1.1,
+        'Off': 0,
+        'SavingOff': 0,
+        'SavingOffUsed': price,
+        'CDT': cdt,
+        'CancelDT': np.where(rng.random(rows) < 0.05, cdt, None),
+        'ReturnPrice': 0,
+        'InstallmentNo': 0,
+        'InstallmentPeriod': 0,
+        'InstallmentFirstCash': 0,
+        'StartDate': start,
+        'EndDate': end,
+        'ServiceIsDel': np.where(rng.random(rows) < 0.01, "Yes", "No"),
+    })
+    return df[RAW_COLUMNS]
+
+
+def write_raw_csv(rows, path, seed=0):
+    make_raw_export(rows, seed=seed).to_csv(path, index=False)
+    return path
@@ -1,105 +1,150 @@
 import streamlit as st
 import pandas as pd
-import jdatetime
-import datetime
-import numpy as np
-import time
-from google.cloud import bigquery
+import io
+import tempfile
+from bq_client import TABLE_NAMES, advance_watermark, get_client, get_watermark, table_path_for, watermark_panel
+from bq_metrics import metrics_panel
+from daily_rollup import refresh_daily_rollup
+from hsp_clean import iter_raw_chunks, read_progress
+from hsp_ingest import find_ingested_files, ledger_entry, load_job_config, merge_upload
+from hsp_parallel import clean_file, merge_by_user_service_id
+from hsp_parquet import parquet_writer, to_arrow_table, write_parquet
+from hsp_profile import make_profiler, profile_panel, profile_toggle
+from hsp_reader import read_export
+from upload_cache import cached_clean_export, cached_clean_preview, content_hash, process_uploads
 
 st.set_page_config(page_title="BigQuery Uploader", layout="centered")
 st.title("📊 بارگذاری داده به BigQuery")
 
 # --- اتصال به BigQuery ---
-credentials_info = dict(st.secrets["gcp_service_account"])
-client = bigquery.Client.from_service_account_info(credentials_info)
+client = get_client()
+metrics_panel()
+# زمان‌سنجی مراحل (خواندن، پاک‌سازی، تبدیل نوع، load job)؛ خاموش باشد هزینه‌ای ندارد
+profiler = make_profiler(profile_toggle())
+
+# --- وضعیت همه جدول‌ها ---
+watermark_panel(client)
 
 # --- انتخاب جدول ---
-table_names = [
-    "hspdata",
-    "hspdata_02",
-    "hspdata_ghor",
-    "hspdata_ac",
-    "test"
-]
-selected_table_name = st.selectbox("✅ نام جدول مقصد را انتخاب کنید", table_names)
-table_path = f"frsphotspots.HSP.{selected_table_name}"
+selected_table_name = st.selectbox("✅ نام جدول مقصد را انتخاب کنید", TABLE_NAMES)
+table_path = table_path_for(selected_table_name)
 
 # --- گرفتن max_usv ---
 max_usv = 0
-query = f"SELECT MAX(UserServiceId) as max_usv FROM `{table_path}`"
 try:
-    result = client.query(query).result()
-    max_usv = next(result)['max_usv'] or 0
+    max_usv = get_watermark(client, table_path)
 except Exception as e:
     st.warning(f"خطا در دریافت بزرگ‌ترین UserServiceId: {e}")
 st.info(f"بزرگترین UserServiceId فعلی: {max_usv}")
 
-# --- آپلود فایل CSV ---
-uploaded_file = st.file_uploader("🔽 فایل CSV خام را بارگذاری کنید", type=['csv'])
-
-if uploaded_file:
-    df_raw = pd.read_csv(uploaded_file)
-
-    columns_to_drop = [
-        'PayPlan', 'DirectOff', 'VAT', 'PayPrice', 'Off', 'SavingOff',
-        'CancelDT', 'ReturnPrice', 'InstallmentNo', 'InstallmentPeriod',
-        'InstallmentFirstCash', 'ServiceIsDel'
-    ]
-    df_clean = df_raw.drop(columns=columns_to_drop, errors='ignore')
-
-    # انتقال ستون تاریخ "CDT" به اول جدول (اگر وجود داشت)
-    cols = list(df_clean.columns)
-    if "CDT" in cols:
-        cols.insert(0, cols.pop(cols.index("CDT")))
-        df_clean = df_clean[cols]
-
-    new_columns = [
-        "CreatDate",
-        "UserServiceId",
-        "Creator",
-        "ServiceName",
-        "Username",
-        "ServiceStatus",
-        "ServicePrice",
-        "Package",
-        "StartDate",
-        "EndDate"
-    ]
-    df_clean.columns = new_columns[:len(df_clean.columns)]
-
-    # فقط بخش تاریخ را نگه‌دار
-    df_clean['CreatDate'] = df_clean['CreatDate'].astype(str).str.split().str[0]
-
-    def to_gregorian_if_jalali(date_str):
+# پیام موفقیت آپلود قبلی (بعد از rerun نمایش داده می‌شود)
+if 'upload_message' in st.session_state:
+    st.success(st.session_state.pop('upload_message'))
+profile_panel(st.session_state.pop('upload_profile', None), "⏱️ زمان مراحل آپلود قبلی")
+
+job_config = load_job_config()
+
+# --- آپلود فایل‌های CSV ---
+uploaded_files = st.file_uploader("🔽 فایل‌های CSV خام را بارگذاری کنید", type=['csv'], accept_multiple_files=True)
+uploaded_file = uploaded_files[0] if len(uploaded_files) == 1 else None
+streaming_mode = st.checkbox("📦 حالت استریم برای فایل‌های حجیم (خواندن و ارسال تکه به تکه؛ فقط تک‌فایل)")
+merge_mode = st.checkbox(
+    "🛡️ حالت ادغام امن (staging + MERGE روی UserServiceId؛ تکرار آپلود ردیف تکراری نمی‌سازد)"
+)
+
+
+def send_parquet(parquet_file, row_count, max_usv, entries):
+    # ارسال فایل Parquet آماده؛ در حالت ادغام امن از مسیر staging + MERGE و دفتر ثبت
+    with profiler.stage("load_job", row_count):
+        if merge_mode:
+            inserted = merge_upload(client, table_path, parquet_file, entries)
+            message = f"✅ ادغام در BigQuery انجام شد. ردیف‌های جدید: {inserted} از {row_count}"
+        else:
+            job = client.load_table_from_file(parquet_file, table_path, job_config=job_config)
+            job.result()
+            message = f"✅ آپلود به BigQuery با موفقیت انجام شد. تعداد ردیف‌ها: {row_count}"
+    advance_watermark(table_path, max_usv)
+    # جدول تجمیع روزانه با ردیف‌های تازه جلو می‌رود؛ خطای آن آپلود را باطل نمی‌کند (تا به‌روزرسانی
+    # بعدی، گزارش‌های تجمیعی از جدول خام خوانده می‌شوند)
+    try:
+        with profiler.stage("daily_rollup"):
+            refresh_daily_rollup(client, table_path)
+    except Exception as e:
+        message += f"\n⚠️ به‌روزرسانی جدول تجمیع روزانه انجام نشد: {e}"
+    st.session_state['upload_message'] = message
+    # زمان مراحل همین آپلود بعد از rerun نمایش داده می‌شود
+    if profiler.enabled:
+        st.session_state['upload_profile'] = profiler.summary()
+        profiler.dump()
+    st.rerun()
+
+
+# فایل‌هایی که قبلاً در همین جدول وارد شده‌اند، بدون خواندن و پاک‌سازی کنار گذاشته می‌شوند
+file_hashes = {}
+if uploaded_files and merge_mode:
+    file_hashes = {f.name: content_hash(f) for f in uploaded_files}
+    ingested = {}
+    try:
+        ingested = find_ingested_files(client, table_path, file_hashes.values())
+    except Exception as e:
+        st.warning(f"خطا در بررسی دفتر ثبت فایل‌ها: {e}")
+    for f in list(uploaded_files):
+        entry = ingested.get(file_hashes[f.name])
+        if entry:
+            st.info(
+                f"فایل {f.name} در {entry['ingested_at']} با نام {entry['file_name']} "
+                f"به این جدول وارد شده است ({entry['row_count']} ردیف، UserServiceId "
+                f"{entry['min_usv']} تا {entry['max_usv']})."
+            )
+            uploaded_files.remove(f)
+    if not uploaded_files:
+        st.stop()
+    uploaded_file = uploaded_files[0] if len(uploaded_files) == 1 else None
+
+if uploaded_file and streaming_mode:
+    # پیش‌نمایش فقط از تکه اول؛ کل فایل یک‌جا در حافظه خوانده نمی‌شود
+    st.info("پیش‌نمایش تکه اول فایل پس از پاک‌سازی:")
+    st.dataframe(cached_clean_preview(uploaded_file, max_usv))
+
+    if st.button("🚀 ارسال داده‌ها به BigQuery"):
+        uploaded_file.seek(0)
+        progress = st.progress(0.0, text="در حال خواندن و فشرده‌سازی تکه‌ها...")
+        total_rows = 0
+        loaded_min = None
+        loaded_max = 0
         try:
-            if not isinstance(date_str, str):
-                return date_str
-            if date_str.startswith('14'):
-                parts = date_str.replace('-', '/').split('/')
-                if len(parts) == 3:
-                    jy, jm, jd = map(int, parts)
-                    gdate = jdatetime.date(jy, jm, jd).togregorian()
-                    return gdate.strftime('%Y-%m-%d')
-            elif date_str.startswith('20'):
-                parts = date_str.replace('-', '/').split('/')
-                if len(parts) == 3:
-                    gy, gm, gd = map(int, parts)
-                    return datetime.date(gy, gm, gd).strftime('%Y-%m-%d')
-            return date_str
-        except Exception:
-            return date_str
-
-    df_clean['CreatDate'] = df_clean['CreatDate'].apply(to_gregorian_if_jalali)
-
-    # مقادیر ستون‌های ServicePrice و Package کاملاً خالی
-    df_clean['ServicePrice'] = np.nan
-    df_clean['Package'] = np.nan
-
-    for col in ['Creator', 'ServiceName', 'Username', 'ServiceStatus', 'StartDate', 'EndDate']:
-        df_clean[col] = df_clean[col].replace({None: '', 'None': '', 'nan': '', 'NaN': '', np.nan: ''})
-
-    df_clean['UserServiceId'] = pd.to_numeric(df_clean['UserServiceId'], errors='coerce')
-    df_clean = df_clean[df_clean['UserServiceId'] > max_usv].reset_index(drop=True)
+            # تکه‌ها به‌صورت row group در یک فایل Parquet موقت روی دیسک نوشته می‌شوند
+            # و کل فایل با یک load job ارسال می‌شود
+            with tempfile.TemporaryFile() as parquet_file:
+                with parquet_writer(parquet_file) as writer:
+                    for df_raw in profiler.iterate("read_csv", iter_raw_chunks(uploaded_file, max_usv)):
+                        df_chunk = profiler.clean_frame(df_raw, max_usv)
+                        del df_raw
+                        if len(df_chunk):
+                            writer.write_table(profiler.run("type_cast", to_arrow_table, df_chunk))
+                            total_rows += len(df_chunk)
+                            chunk_min = df_chunk['UserServiceId'].min()
+                            loaded_min = chunk_min if loaded_min is None else min(loaded_min, chunk_min)
+                            loaded_max = max(loaded_max, df_chunk['UserServiceId'].max())
+                        progress.progress(read_progress(uploaded_file), text=f"ردیف‌های آماده ارسال: {total_rows}")
+                        del df_chunk
+                if total_rows == 0:
+                    st.warning("دیتایی برای آپلود وجود ندارد.")
+                else:
+                    progress.progress(1.0, text=f"در حال ارسال {total_rows} ردیف به BigQuery...")
+                    parquet_file.seek(0)
+                    entry = ledger_entry(file_hashes.get(uploaded_file.name), uploaded_file.name,
+                                         loaded_min, loaded_max, total_rows)
+                    send_parquet(parquet_file, total_rows, loaded_max, [entry])
+        except Exception as e:
+            st.error(f"❌ خطا در ارسال داده به بیگ‌کوئری:\n{e}")
+
+elif uploaded_file:
+    # نتیجه با هش محتوای فایل کش می‌شود؛ rerunهای بعدی (کلیک‌ها) فایل را دوباره نمی‌خوانند
+    df_clean = cached_clean_export(
+        uploaded_file, max_usv,
+        read=lambda f: profiler.run("read_csv", read_export, f), clean=profiler.clean_frame
+    )
 
     st.info(f"تعداد ردیف قابل آپلود: {len(df_clean)}")
     st.dataframe(df_clean)
@@ -108,37 +153,69 @@ if uploaded_file:
         st.warning("دیتایی برای آپلود وجود ندارد.")
     else:
         if st.button("🚀 ارسال داده‌ها به BigQuery"):
-            # تبدیل نوع داده قبل از ارسال
-            df_clean['CreatDate'] = pd.to_datetime(df_clean['CreatDate'], errors='coerce').dt.date
-            df_clean['UserServiceId'] = pd.to_numeric(df_clean['UserServiceId'], errors='coerce').astype('Int64')
-            df_clean['ServicePrice'] = pd.to_numeric(df_clean['ServicePrice'], errors='coerce')
-            df_clean['Package'] = pd.to_numeric(df_clean['Package'], errors='coerce')
-            for col in ['Creator', 'ServiceName', 'Username', 'ServiceStatus', 'StartDate', 'EndDate']:
-                df_clean[col] = df_clean[col].astype(str)
-
-            job_config = bigquery.LoadJobConfig(
-                write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-                source_format=bigquery.SourceFormat.CSV,
-                skip_leading_rows=0,
-                schema=[
-                    bigquery.SchemaField("CreatDate", "DATE"),
-                    bigquery.SchemaField("UserServiceId", "INTEGER"),
-                    bigquery.SchemaField("Creator", "STRING"),
-                    bigquery.SchemaField("ServiceName", "STRING"),
-                    bigquery.SchemaField("Username", "STRING"),
-                    bigquery.SchemaField("ServiceStatus", "STRING"),
-                    bigquery.SchemaField("ServicePrice", "FLOAT"),
-                    bigquery.SchemaField("Package", "FLOAT"),
-                    bigquery.SchemaField("StartDate", "STRING"),
-                    bigquery.SchemaField("EndDate", "STRING"),
-                ]
-            )
+            try:
+                parquet_buffer = io.BytesIO()
+                with profiler.stage("type_cast", len(df_clean)):
+                    write_parquet(df_clean, parquet_buffer)
+                parquet_buffer.seek(0)
+                entry = ledger_entry(file_hashes.get(uploaded_file.name), uploaded_file.name,
+                                     df_clean['UserServiceId'].min(), df_clean['UserServiceId'].max(), len(df_clean))
+                send_parquet(parquet_buffer, len(df_clean), entry['max_usv'], [entry])
+            except Exception as e:
+                st.error(f"❌ خطا در ارسال داده به بیگ‌کوئری:\n{e}")
 
+elif uploaded_files:
+    # چند فایل: هر فایل در یک پروسه جدا خوانده و پاک‌سازی می‌شود، سپس همه به ترتیب
+    # UserServiceId ادغام و با یک load job ارسال می‌شوند
+    progress = st.progress(0.0, text=f"در حال پاک‌سازی {len(uploaded_files)} فایل...")
+    status_rows = []
+    frames = []
+    entries = []
+    # هر فایل در پروسه جدا پاک‌سازی می‌شود؛ زمان‌سنجی برای کل مرحله موازی است نه تک‌تک مراحل
+    with profiler.stage("read_clean_files") as record:
+        for done, (name, result, error) in enumerate(process_uploads(clean_file, uploaded_files, max_usv), start=1):
+            if error is not None:
+                status_rows.append({'فایل': name, 'ردیف خام': None, 'ردیف جدید': None, 'وضعیت': f"❌ {error}"})
+            else:
+                raw_rows, df_file = result
+                ids = df_file['UserServiceId']
+                status_rows.append({
+                    'فایل': name,
+                    'ردیف خام': raw_rows,
+                    'ردیف جدید': len(df_file),
+                    'کمترین UserServiceId': ids.min() if len(ids) else None,
+                    'بیشترین UserServiceId': ids.max() if len(ids) else None,
+                    'وضعیت': "✅" if len(df_file) else "بدون ردیف جدید",
+                })
+                if len(df_file):
+                    frames.append(df_file)
+                    entries.append(ledger_entry(file_hashes.get(name), name, ids.min(), ids.max(), len(df_file)))
+            progress.progress(done / len(uploaded_files), text=f"فایل‌های پاک‌سازی‌شده: {done} از {len(uploaded_files)}")
+        record["rows_in"] = sum(row['ردیف خام'] or 0 for row in status_rows)
+        record["rows_out"] = sum(row['ردیف جدید'] or 0 for row in status_rows)
+    st.dataframe(pd.DataFrame(status_rows), hide_index=True)
+
+    df_clean, duplicates = profiler.run("merge_files", merge_by_user_service_id, frames)
+    del frames
+    if duplicates:
+        st.info(f"{duplicates} ردیف تکراری بین فایل‌ها حذف شد.")
+    st.info(f"تعداد ردیف قابل آپلود: {len(df_clean)}")
+    st.dataframe(df_clean.head(1000))
+
+    if len(df_clean) == 0:
+        st.warning("دیتایی برای آپلود وجود ندارد.")
+    elif any(row['وضعیت'].startswith("❌") for row in status_rows):
+        st.error("خواندن بعضی فایل‌ها با خطا مواجه شد؛ آن‌ها را اصلاح یا حذف کنید.")
+    else:
+        if st.button("🚀 ارسال داده‌ها به BigQuery"):
             try:
-                job = client.load_table_from_dataframe(df_clean, table_path, job_config=job_config)
-                job.result()
-                st.success(f"✅ آپلود به BigQuery با موفقیت انجام شد. تعداد ردیف‌ها: {len(df_clean)}")
-                time.sleep(2)
-                st.rerun()
+                parquet_buffer = io.BytesIO()
+                with profiler.stage("type_cast", len(df_clean)):
+                    write_parquet(df_clean, parquet_buffer)
+                parquet_buffer.seek(0)
+                send_parquet(parquet_buffer, len(df_clean), df_clean['UserServiceId'].max(), entries)
             except Exception as e:
                 st.error(f"❌ خطا در ارسال داده به بیگ‌کوئری:\n{e}")
+
+profile_panel(profiler.summary())
+profiler.dump()
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+from google.cloud import bigquery
+
+from bq_metrics import InstrumentedClient
+from hsp_tables import DATASET, TABLE_NAMES, table_path_for
+
+# مدت اعتبار بزرگ‌ترین UserServiceId کش‌شده هر جدول (ثانیه)
+WATERMARK_TTL_SECONDS = 300
+
+# کش سراسری پروسه: {table_path: (max_usv, زمان دریافت)}
+_watermarks = {}
+_watermarks_lock = threading.Lock()
+
+# کش وضعیت همه جدول‌ها: {tuple(table_names): (DataFrame, زمان دریافت)}
+_table_stats = {}
+
+
+@st.cache_resource
+def get_client():
+    # یک کلاینت برای کل پروسه؛ بین rerunها و سشن‌ها مشترک است. همه کوئری‌ها و load jobها
+    # از InstrumentedClient ثبت می‌شوند (پنل metrics_panel و فایل JSONL)
+    credentials_info = dict(st.secrets["gcp_service_account"])
+    return InstrumentedClient(bigquery.Client.from_service_account_info(credentials_info))
+
+
+def get_watermark(client, table_path, ttl=WATERMARK_TTL_SECONDS):
+    # بزرگ‌ترین UserServiceId جدول؛ تا ttl ثانیه از کش خوانده می‌شود و کوئری نمی‌زند
+    with _watermarks_lock:
+        cached = _watermarks.get(table_path)
+    if cached and time.monotonic() - cached[1] < ttl:
+        return cached[0]
+
+    query = f"SELECT MAX(UserServiceId) as max_usv FROM `{table_path}`"
+    result = client.query(query).result()
+    max_usv = next(result)['max_usv'] or 0
+    with _watermarks_lock:
+        _watermarks[table_path] = (max_usv, time.monotonic())
+    return max_usv
+
+
+def advance_watermark(table_path, loaded_max):
+    # بعد از آپلود موفق، کش به‌صورت محلی جلو می‌رود و نیازی به کوئری دوباره MAX نیست
+    with _watermarks_lock:
+        _table_stats.clear()
+        cached = _watermarks.get(table_path)
+        if cached:
+            _watermarks[table_path] = (max(cached[0], int(loaded_max)), time.monotonic())
+
+
+def invalidate_watermark(table_path=None):
+    with _watermarks_lock:
+        _table_stats.clear()
+        if table_path is None:
+            _watermarks.clear()
+        else:
+            _watermarks.pop(table_path, None)
+
+
+def get_table_stats(client, table_names=TABLE_NAMES, ttl=WATERMARK_TTL_SECONDS):
+    # بزرگ‌ترین UserServiceId، تعداد ردیف و آخرین CreatDate همه جدول‌ها با یک کوئری UNION ALL
+    key = tuple(table_names)
+    with _watermarks_lock:
+        cached = _table_stats.get(key)
+    if cached and time.monotonic() - cached[1] < ttl:
+        return cached[0]
+
+    query = "\nUNION ALL\n".join(
+        f"SELECT '{name}' AS table_name, MAX(UserServiceId) AS max_usv, "
+        f"COUNT(*) AS row_count, MAX(CreatDate) AS last_creat_date "
+        f"FROM `{table_path_for(name)}`"
+        for name in table_names
+    )
+    rows = [dict(row) for row in client.query(query).result()]
+    order = {name: i for i, name in enumerate(table_names)}
+    stats = pd.DataFrame(rows, columns=['table_name', 'max_usv', 'row_count', 'last_creat_date'])
+    stats = stats.sort_values('table_name', key=lambda s: s.map(order)).reset_index(drop=True)
+
+    now = time.monotonic()
+    with _watermarks_lock:
+        _table_stats[key] = (stats, now)
+        # همین نتیجه کش بزرگ‌ترین UserServiceId تک‌تک جدول‌ها را هم پر می‌کند
+        for row in stats.itertuples():
+            _watermarks[table_path_for(row.table_name)] = (int(row.max_usv) if pd.notna(row.max_usv) else 0, now)
+    return stats
+
+
+def watermark_panel(client, table_names=TABLE_NAMES):
+    # پنل وضعیت همه جدول‌ها در کنار هم، تا جدول‌های عقب‌مانده بدون کلیک روی تک‌تک‌شان دیده شوند
+    with st.expander("📋 وضعیت همه جدول‌ها"):
+        if st.button("🔄 به‌روزرسانی وضعیت جدول‌ها"):
+            invalidate_watermark()
+        try:
+            stats = get_table_stats(client, table_names).copy()
+        except Exception as e:
+            st.warning(f"خطا در دریافت وضعیت جدول‌ها: {e}")
+            return
+        last_dates = pd.to_datetime(stats['last_creat_date'])
+        stats['days_behind'] = (pd.Timestamp.today().normalize() - last_dates).dt.days
+        st.dataframe(stats, hide_index=True)
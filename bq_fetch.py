@@ -0,0 +1,88 @@
+import importlib.util
+
+import pandas as pd
+import pyarrow as pa
+from google.cloud import bigquery
+
+# اگر پکیج BigQuery Storage نصب باشد، نتایج بزرگ از Read API (استریم Arrow) خوانده می‌شوند
+HAS_BQSTORAGE = importlib.util.find_spec("google.cloud.bigquery_storage") is not None
+
+# نوع pandas ستون‌های Arrow؛ عدد صحیح با مقدار خالی به float تبدیل نمی‌شود
+_PANDAS_TYPES = {
+    pa.int64(): pd.Int64Dtype(),
+}
+
+
+class BigQueryBackend:
+    # هر شیئی که متد query_arrow(query, params) -> pyarrow.Table داشته باشد
+    # (مثلاً یک backend محلی برای تست) می‌تواند جای این کلاس استفاده شود
+
+    def __init__(self, client):
+        self.client = client
+
+    def query_arrow(self, query, params=()):
+        job_config = bigquery.QueryJobConfig(query_parameters=list(params))
+        results = self.client.query(query, job_config).result()
+        return results.to_arrow(create_bqstorage_client=HAS_BQSTORAGE)
+
+    def query_arrow_batches(self, query, params=(), page_size=None):
+        # نتیجه یک کوئری، صفحه‌به‌صفحه (هر صفحه یک RecordBatch) بدون نگه داشتن کل آن در حافظه
+        job_config = bigquery.QueryJobConfig(query_parameters=list(params))
+        results = self.client.query(query, job_config).result(page_size=page_size)
+        return results.to_arrow_iterable()
+
+    def open_result(self, query, params=()):
+        # کوئری یک‌بار اجرا می‌شود؛ جدول نتیجه job (تا حدود ۲۴ ساعت) بعداً صفحه‌به‌صفحه خوانده می‌شود
+        job_config = bigquery.QueryJobConfig(query_parameters=list(params))
+        job = self.client.query(query, job_config)
+        job.result()
+        return job.destination
+
+    def read_result(self, result, start, page_size):
+        # tabledata.list با start_index؛ بدون اجرای دوباره کوئری و بدون هزینه اسکن
+        rows = self.client.list_rows(result, start_index=start, max_results=page_size)
+        return rows.to_arrow(create_bqstorage_client=False)
+
+
+def as_backend(client):
+    return client if hasattr(client, "query_arrow") else BigQueryBackend(client)
+
+
+def arrow_to_dataframe(table):
+    # تبدیل ستونی (بدون ساختن dict برای هر ردیف)؛ DATE به datetime.date تبدیل می‌شود مثل قبل
+    return table.to_pandas(types_mapper=_PANDAS_TYPES.get)
+
+
+def fetch_dataframe(client, query, params=()):
+    return arrow_to_dataframe(as_backend(client).query_arrow(query, params))
+
+
+class _MaterializedResult:
+    # برای backendی که open_result ندارد: کل نتیجه در حافظه (کلید کش با هویت شیء)
+
+    def __init__(self, table):
+        self.table = table
+
+
+def open_result(client, query, params=()):
+    backend = as_backend(client)
+    if hasattr(backend, "open_result"):
+        return backend.open_result(query, params)
+    return _MaterializedResult(backend.query_arrow(query, params))
+
+
+def fetch_result_page(client, result, start, page_size):
+    if isinstance(result, _MaterializedResult):
+        return arrow_to_dataframe(result.table.slice(start, page_size))
+    return arrow_to_dataframe(as_backend(client).read_result(result, start, page_size))
+
+
+def iter_dataframes(client, query, params=(), page_size=None):
+    # backendی که query_arrow_batches ندارد کل نتیجه را یک‌جا برمی‌گرداند
+    backend = as_backend(client)
+    if not hasattr(backend, "query_arrow_batches"):
+        yield arrow_to_dataframe(backend.query_arrow(query, params))
+        return
+    for batch in backend.query_arrow_batches(query, params, page_size):
+        if batch.num_rows:
+            yield arrow_to_dataframe(pa.Table.from_batches([batch]))
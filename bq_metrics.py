@@ -0,0 +1,179 @@
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+from google.cloud import bigquery
+
+# فایل JSONL محلی که هر کوئری / load job یک خط در آن ثبت می‌کند (خالی = بدون فایل)
+QUERY_LOG_PATH = os.environ.get("HSP_QUERY_LOG", "bq_queries.jsonl")
+
+# سقف بایت پردازش‌شده هر کوئری؛ اگر تنظیم شود، قبل از اجرا dry-run گرفته و کوئری بزرگ‌تر رد می‌شود
+QUERY_BUDGET_BYTES = int(os.environ.get("HSP_QUERY_BUDGET_BYTES", "0")) or None
+
+# تعداد رکوردهای اخیر که برای پنل در حافظه نگه داشته می‌شود
+RECENT_METRICS = 500
+
+_MAX_PARAM_ITEMS = 20
+
+_recent = deque(maxlen=RECENT_METRICS)
+_lock = threading.Lock()
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(query):
+    # کوئری‌هایی که فقط در مقادیر ثابت یا فاصله‌ها فرق دارند یک اثرانگشت دارند
+    normalized = _SPACES.sub(" ", _LITERALS.sub("?", query)).strip()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+def _param_value(param):
+    if isinstance(param, bigquery.ArrayQueryParameter):
+        values = [str(v) for v in param.values[:_MAX_PARAM_ITEMS]]
+        if len(param.values) > _MAX_PARAM_ITEMS:
+            values.append(f"... +{len(param.values) - _MAX_PARAM_ITEMS}")
+        return values
+    value = getattr(param, "value", None)
+    return value if isinstance(value, (int, float, bool, type(None))) else str(value)
+
+
+def describe_params(job_config):
+    params = getattr(job_config, "query_parameters", None) or []
+    return {getattr(p, "name", None) or str(i): _param_value(p) for i, p in enumerate(params)}
+
+
+def record(entry):
+    with _lock:
+        _recent.append(entry)
+        if QUERY_LOG_PATH:
+            try:
+                with open(QUERY_LOG_PATH, "a", encoding="utf-8") as log:
+                    log.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            except OSError:
+                pass
+
+
+def recent_metrics():
+    with _lock:
+        return list(_recent)
+
+
+class InstrumentedJob:
+    # همان job اصلی؛ فقط result() زمان، حجم پردازش و تعداد ردیف را ثبت می‌کند
+
+    def __init__(self, job, entry, started):
+        self._job = job
+        self._entry = entry
+        self._started = started
+        self._recorded = False
+
+    def __getattr__(self, name):
+        return getattr(self._job, name)
+
+    def result(self, *args, **kwargs):
+        try:
+            rows = self._job.result(*args, **kwargs)
+        except Exception as e:
+            self._record(error=str(e))
+            raise
+        total_rows = getattr(rows, "total_rows", None)
+        self._record(rows=total_rows if total_rows is not None else getattr(self._job, "output_rows", None))
+        return rows
+
+    def _record(self, rows=None, error=None):
+        if self._recorded:
+            return
+        self._recorded = True
+        job = self._job
+        self._entry.update(
+            wall_ms=round((time.perf_counter() - self._started) * 1000, 1),
+            job_id=getattr(job, "job_id", None),
+            bytes_processed=getattr(job, "total_bytes_processed", None),
+            bytes_billed=getattr(job, "total_bytes_billed", None),
+            slot_ms=getattr(job, "slot_millis", None),
+            cache_hit=getattr(job, "cache_hit", None),
+            rows=rows,
+            error=error,
+        )
+        record(self._entry)
+
+
+class InstrumentedClient:
+    # لایه نازک روی bigquery.Client؛ همه query و load_table_from_file ها از اینجا ثبت می‌شوند
+    # و بقیه متدها بدون تغییر به کلاینت اصلی می‌رسند
+
+    def __init__(self, client, budget_bytes=QUERY_BUDGET_BYTES):
+        self._client = client
+        self.budget_bytes = budget_bytes
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def _entry(self, kind, query=None, job_config=None, target=None):
+        return {
+            "ts": datetime.datetime.now().isoformat(timespec="seconds"),
+            "kind": kind,
+            "fingerprint": fingerprint(query) if query else None,
+            "sql": _SPACES.sub(" ", query).strip()[:500] if query else None,
+            "params": describe_params(job_config),
+            "target": target,
+        }
+
+    def estimate_bytes(self, query, job_config=None):
+        # dry-run رایگان: بایت‌هایی که کوئری پردازش خواهد کرد
+        config = bigquery.QueryJobConfig.from_api_repr(job_config.to_api_repr()) if job_config else bigquery.QueryJobConfig()
+        config.dry_run = True
+        config.use_query_cache = False
+        return self._client.query(query, job_config=config).total_bytes_processed
+
+    def query(self, query, job_config=None, *args, **kwargs):
+        entry = self._entry("query", query, job_config)
+        started = time.perf_counter()
+        if self.budget_bytes:
+            estimated = self.estimate_bytes(query, job_config)
+            entry["estimated_bytes"] = estimated
+            if estimated and estimated > self.budget_bytes:
+                entry.update(kind="refused", wall_ms=round((time.perf_counter() - started) * 1000, 1))
+                record(entry)
+                raise QueryBudgetExceeded(
+                    f"کوئری حدود {estimated / 2**30:.2f} GiB پردازش می‌کند که از سقف "
+                    f"{self.budget_bytes / 2**30:.2f} GiB بیشتر است."
+                )
+        job = self._client.query(query, job_config, *args, **kwargs)
+        return InstrumentedJob(job, entry, started)
+
+    def load_table_from_file(self, file_obj, destination, *args, **kwargs):
+        entry = self._entry("load", target=str(destination))
+        started = time.perf_counter()
+        job = self._client.load_table_from_file(file_obj, destination, *args, **kwargs)
+        return InstrumentedJob(job, entry, started)
+
+
+def metrics_panel(limit=50):
+    # پنل کنار صفحه: کوئری‌های اخیر همین پروسه با زمان، حجم پردازش و برخورد کش. streamlit فقط
+    # همین‌جا لازم است تا InstrumentedClient در اسکریپت‌های خط فرمان بدون آن هم کار کند
+    import streamlit as st
+    with st.sidebar.expander("⏱️ هزینه و زمان کوئری‌ها"):
+        metrics = recent_metrics()
+        if not metrics:
+            st.caption("هنوز کوئری‌ای اجرا نشده است.")
+            return
+        df = pd.DataFrame(metrics[-limit:][::-1])
+        billed = df['bytes_billed'].fillna(0).sum() if 'bytes_billed' in df.columns else 0
+        cache_hits = df['cache_hit'].fillna(False).astype(bool).sum() if 'cache_hit' in df.columns else 0
+        st.metric("حجم محاسبه‌شده (GiB)", f"{billed / 2**30:.3f}")
+        st.caption(f"{len(df)} اجرای اخیر، {cache_hits} برخورد کش BigQuery")
+        columns = [c for c in ['ts', 'kind', 'fingerprint', 'wall_ms', 'bytes_processed', 'bytes_billed',
+                               'slot_ms', 'cache_hit', 'rows', 'error', 'sql'] if c in df.columns]
+        st.dataframe(df[columns], hide_index=True)
@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from google.cloud import bigquery
+
+from bq_fetch import fetch_dataframe
+from hsp_tables import table_path_for
+
+# حداکثر تعداد کوئری هم‌زمان در مسیر جایگزین (وقتی کوئری تجمیعی ممکن نباشد)
+MAX_LOOKUP_WORKERS = 8
+
+
+def find_creator_data(client, creator, query_base, params, tables_priority):
+    # جستجوی یک Creator در جدول‌ها به ترتیب اولویت؛ اولین جدولی که رکورد داشت برمی‌گردد
+    for table_name in tables_priority:
+        query = query_base.format(table_path=table_path_for(table_name))
+        try:
+            df = fetch_dataframe(client, query, params)
+            print(f"جدول: {table_name}, Creator: {creator}, تعداد رکورد: {len(df)}")
+            if not df.empty:
+                return df, table_name
+        except Exception as e:
+            print(f"خطا در جدول {table_name}: {e}")
+            continue
+    print(f"{creator} در هیچ جدول یافت نشد.")
+    return pd.DataFrame(), None
+
+
+def build_batched_query(tables_priority, conditions):
+    # همه جدول‌ها با برچسب اولویت UNION ALL می‌شوند و برای هر Creator فقط
+    # رکوردهای جدولی با کمترین اولویت (اولین جدول دارای داده) نگه داشته می‌شود
+    where_clause = " AND ".join(["Creator IN UNNEST(@creator_list)"] + conditions)
+    union = "\n    UNION ALL\n".join(
+        f"    SELECT {priority} AS _priority, '{table_name}' AS _source_table, t.* "
+        f"FROM `{table_path_for(table_name)}` t WHERE {where_clause}"
+        for priority, table_name in enumerate(tables_priority)
+    )
+    return f"""
+    WITH tagged AS (
+{union}
+    )
+    SELECT * FROM tagged
+    WHERE TRUE
+    QUALIFY _priority = MIN(_priority) OVER (PARTITION BY Creator)
+    """
+
+
+def find_creators_batched(client, creators, tables_priority, conditions, params):
+    unique_creators = list(dict.fromkeys(creators))
+    query = build_batched_query(tables_priority, conditions)
+    params = [bigquery.ArrayQueryParameter("creator_list", "STRING", unique_creators)] + list(params)
+    df = fetch_dataframe(client, query, params)
+
+    results = {}
+    groups = dict(tuple(df.groupby('Creator', sort=False))) if not df.empty else {}
+    for creator in unique_creators:
+        group = groups.get(creator)
+        if group is None:
+            print(f"{creator} در هیچ جدول یافت نشد.")
+            results[creator] = (pd.DataFrame(), None)
+            continue
+        used_table = group['_source_table'].iloc[0]
+        print(f"جدول: {used_table}, Creator: {creator}, تعداد رکورد: {len(group)}")
+        data = group.drop(columns=['_priority', '_source_table']).reset_index(drop=True)
+        results[creator] = (data, used_table)
+    return results
+
+
+def find_creators_concurrent(client, creators, tables_priority, conditions, params, max_workers=MAX_LOOKUP_WORKERS):
+    # مسیر جایگزین: همان جستجوی تک‌به‌تک، اما برای Creatorها به‌صورت موازی با تعداد محدود thread
+    where_clause = " AND ".join(["Creator = @creator"] + conditions)
+    query_base = "SELECT * FROM {table_path} WHERE " + where_clause
+    unique_creators = list(dict.fromkeys(creators))
+
+    def lookup(creator):
+        creator_params = [bigquery.ScalarQueryParameter("creator", "STRING", creator)] + list(params)
+        return find_creator_data(client, creator, query_base, creator_params, tables_priority)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(unique_creators, pool.map(lookup, unique_creators)))
+
+
+def find_creators_data(client, creators, tables_priority, conditions, params):
+    # خروجی: {creator: (DataFrame, نام جدول یا None)}
+    try:
+        return find_creators_batched(client, creators, tables_priority, conditions, params)
+    except Exception as e:
+        print(f"کوئری تجمیعی ممکن نشد ({e})؛ جستجوی موازی جدول به جدول انجام می‌شود.")
+        return find_creators_concurrent(client, creators, tables_priority, conditions, params)
@@ -0,0 +1,132 @@
+import pandas as pd
+from google.cloud import bigquery
+
+from bq_fetch import fetch_dataframe
+from hsp_tables import DATASET
+
+# جدول تجمیع روزانه هر جدول HSP: یک ردیف برای هر (CreatDate, Creator, ServiceName).
+# به‌روزرسانی عادی فقط ردیف‌های با UserServiceId بزرگ‌تر از آخرین مقدار حساب‌شده را اضافه می‌کند؛
+# اگر تعداد ردیف جدول خام با تعداد حساب‌شده جور نباشد (ردیف بدون UserServiceId، ردیفی که ادغام امن
+# زیر آخرین مقدار حساب‌شده درج کرده یا ردیف حذف‌شده)، کل جدول روزانه دوباره ساخته می‌شود
+ROLLUP_SUFFIX = "_daily"
+
+# برای هر جدول: بزرگ‌ترین UserServiceId و تعداد کل ردیف‌هایی که در تجمیع روزانه حساب شده‌اند
+ROLLUP_STATE_TABLE = f"{DATASET}.daily_rollup_state"
+
+ROLLUP_SCHEMA = [
+    ("CreatDate", "DATE"),
+    ("Creator", "STRING"),
+    ("ServiceName", "STRING"),
+    ("row_count", "INT64"),
+    ("usv_count", "INT64"),
+    ("package_sum", "FLOAT64"),
+    ("package_count", "INT64"),
+]
+
+_MEASURE_COLUMNS = [name for name, _ in ROLLUP_SCHEMA[3:]]
+
+# تجمیع ردیف‌های خام با همان ستون‌های جدول روزانه
+RAW_AGGREGATES = """
+      COUNT(*) AS row_count,
+      COUNT(UserServiceId) AS usv_count,
+      IFNULL(SUM(CAST(Package AS FLOAT64)), 0) AS package_sum,
+      COUNT(Package) AS package_count"""
+
+
+def rollup_path_for(table_path):
+    return f"{table_path}{ROLLUP_SUFFIX}"
+
+
+def ensure_daily_rollup(client, table_path):
+    columns = ", ".join(f"{name} {field_type}" for name, field_type in ROLLUP_SCHEMA)
+    client.query(f"""
+    CREATE TABLE IF NOT EXISTS `{rollup_path_for(table_path)}` ({columns})
+    PARTITION BY CreatDate
+    CLUSTER BY Creator, ServiceName;
+    CREATE TABLE IF NOT EXISTS `{ROLLUP_STATE_TABLE}` (
+      table_name STRING, max_usv INT64, row_count INT64, updated_at TIMESTAMP
+    );
+    ALTER TABLE `{ROLLUP_STATE_TABLE}` ADD COLUMN IF NOT EXISTS row_count INT64;
+    """).result()
+
+
+def build_refresh_script(table_path):
+    # ردیف‌های بعد از آخرین UserServiceId حساب‌شده تجمیع و به جدول روزانه اضافه می‌شوند؛ اگر بعد از
+    # آن تعداد ردیف‌های حساب‌شده با COUNT(*) جدول خام (از metadata، بدون اسکن) برابر نباشد، جدول
+    # روزانه از کل جدول خام دوباره ساخته می‌شود. جدول روزانه و وضعیت آن در یک تراکنش جلو می‌روند و
+    # دو به‌روزرسانی هم‌زمان دوبار نمی‌شمارند. اولین اجرا (وضعیت خالی) کل جدول را تجمیع می‌کند
+    rollup_path = rollup_path_for(table_path)
+    updates = ", ".join(f"{name} = R.{name} + D.{name}" for name in _MEASURE_COLUMNS)
+    columns = ", ".join(name for name, _ in ROLLUP_SCHEMA)
+    values = ", ".join(f"D.{name}" for name, _ in ROLLUP_SCHEMA)
+    return f"""
+    DECLARE last_usv INT64;
+    DECLARE counted_rows INT64;
+    DECLARE new_usv INT64;
+    DECLARE new_rows INT64;
+    DECLARE raw_rows INT64;
+    BEGIN TRANSACTION;
+    SET (last_usv, counted_rows) = (
+      SELECT AS STRUCT IFNULL(MAX(max_usv), 0), IFNULL(MAX(row_count), 0)
+      FROM `{ROLLUP_STATE_TABLE}` WHERE table_name = '{table_path}'
+    );
+    SET (new_usv, new_rows) = (
+      SELECT AS STRUCT MAX(UserServiceId), COUNT(*) FROM `{table_path}` WHERE UserServiceId > last_usv
+    );
+    SET raw_rows = (SELECT COUNT(*) FROM `{table_path}`);
+    IF raw_rows = counted_rows + new_rows THEN
+      MERGE `{rollup_path}` R
+      USING (
+        SELECT CreatDate, Creator, ServiceName,{RAW_AGGREGATES}
+        FROM `{table_path}`
+        WHERE UserServiceId > last_usv AND UserServiceId <= new_usv
+        GROUP BY CreatDate, Creator, ServiceName
+      ) D
+      ON R.CreatDate IS NOT DISTINCT FROM D.CreatDate
+        AND R.Creator IS NOT DISTINCT FROM D.Creator
+        AND R.ServiceName IS NOT DISTINCT FROM D.ServiceName
+      WHEN MATCHED THEN UPDATE SET {updates}
+      WHEN NOT MATCHED THEN INSERT ({columns}) VALUES ({values});
+      SET new_usv = IFNULL(new_usv, last_usv);
+    ELSE
+      DELETE FROM `{rollup_path}` WHERE TRUE;
+      INSERT INTO `{rollup_path}` ({columns})
+      SELECT CreatDate, Creator, ServiceName,{RAW_AGGREGATES}
+      FROM `{table_path}`
+      GROUP BY CreatDate, Creator, ServiceName;
+      SET new_usv = (SELECT IFNULL(MAX(UserServiceId), 0) FROM `{table_path}`);
+    END IF;
+    MERGE `{ROLLUP_STATE_TABLE}` S
+    USING (SELECT '{table_path}' AS table_name, new_usv AS max_usv, raw_rows AS row_count) N
+    ON S.table_name = N.table_name
+    WHEN MATCHED THEN
+      UPDATE SET max_usv = N.max_usv, row_count = N.row_count, updated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (table_name, max_usv, row_count, updated_at)
+      VALUES (N.table_name, N.max_usv, N.row_count, CURRENT_TIMESTAMP());
+    COMMIT TRANSACTION;
+    """
+
+
+def refresh_daily_rollup(client, table_path):
+    # بعد از هر آپلود موفق صدا زده می‌شود
+    ensure_daily_rollup(client, table_path)
+    client.query(build_refresh_script(table_path)).result()
+
+
+def rollup_is_exact(client, table_path):
+    # جدول روزانه فقط وقتی دقیق است که همه ردیف‌های جدول خام را حساب کرده باشد (جدول‌ها فقط ردیف
+    # اضافه می‌کنند، پس برابری تعداد یعنی برابری ردیف‌ها). COUNT(*) بدون فیلتر در BigQuery از
+    # metadata خوانده می‌شود. اگر جدول وضعیت نباشد NotFound می‌دهد
+    query = f"""
+    SELECT
+      (SELECT COUNT(*) FROM `{table_path}`) AS raw_rows,
+      (SELECT MAX(row_count) FROM `{ROLLUP_STATE_TABLE}` WHERE table_name = @table_name) AS counted_rows
+    """
+    params = [bigquery.ScalarQueryParameter("table_name", "STRING", table_path)]
+    row = fetch_dataframe(client, query, params).iloc[0]
+    return pd.notna(row['counted_rows']) and int(row['raw_rows']) == int(row['counted_rows'])
+
+
+def daily_source(table_path):
+    # منبع گزارش‌های تجمیعی وقتی rollup_is_exact برقرار است
+    return f"`{rollup_path_for(table_path)}`"
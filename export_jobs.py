@@ -0,0 +1,138 @@
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import streamlit as st
+
+# تعداد خروجی (CSV / PDF) که هم‌زمان ساخته می‌شوند
+EXPORT_WORKERS = 4
+
+# تعداد کارهای تمام‌شده هر سشن که فایلشان در حافظه نگه داشته می‌شود (قدیمی‌ترها حذف می‌شوند)
+MAX_FINISHED_JOBS = 10
+
+# سقف حجم کل فایل‌های آماده در حافظه (همه سشن‌ها)؛ با عبور از آن قدیمی‌ترین فایل‌ها حذف می‌شوند
+MAX_EXPORT_BYTES = 512 * 2**20
+
+# فاصله به‌روزرسانی پنل خروجی‌ها در حال ساخت (ثانیه)
+POLL_SECONDS = 1
+
+_pool = ThreadPoolExecutor(max_workers=EXPORT_WORKERS)
+_jobs = {}
+_lock = threading.Lock()
+_ids = itertools.count(1)
+
+
+@dataclass
+class ExportJob:
+    job_id: str
+    session_id: str
+    label: str
+    file_name: str
+    mime: str
+    status: str = "queued"  # "queued" / "running" / "done" / "error"
+    progress: float = 0.0
+    data: bytes = None
+    error: str = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float = None
+
+    @property
+    def finished(self):
+        return self.status in ("done", "error")
+
+    @property
+    def size(self):
+        return len(self.data) if self.data else 0
+
+
+def _run(job, build):
+    job.status = "running"
+
+    def report_progress(fraction):
+        job.progress = min(max(float(fraction), 0.0), 1.0)
+
+    try:
+        job.data = build(report_progress)
+        job.progress = 1.0
+        job.status = "done"
+    except Exception as e:
+        job.error = str(e)
+        job.status = "error"
+    job.finished_at = time.time()
+    _forget_old_jobs(job.session_id)
+
+
+def _forget_old_jobs(session_id):
+    with _lock:
+        finished = sorted((j for j in _jobs.values() if j.finished), key=lambda j: j.finished_at)
+        own = [j for j in finished if j.session_id == session_id]
+        for job in own[:-MAX_FINISHED_JOBS]:
+            del _jobs[job.job_id]
+        finished = [j for j in finished if j.job_id in _jobs]
+        total = sum(j.size for j in finished)
+        for job in finished[:-1]:
+            if total <= MAX_EXPORT_BYTES:
+                break
+            total -= job.size
+            del _jobs[job.job_id]
+
+
+def _session_id():
+    return st.session_state.setdefault("export_session", uuid.uuid4().hex)
+
+
+def submit_export(label, file_name, mime, build):
+    # build(progress) در پس‌زمینه اجرا می‌شود و bytes فایل را برمی‌گرداند؛ progress(کسر بین ۰ و ۱)
+    # پیشرفت را گزارش می‌کند. شناسه کار برمی‌گردد و اسکریپت Streamlit منتظر نمی‌ماند
+    job = ExportJob(f"{time.strftime('%H%M%S')}-{next(_ids)}", _session_id(), label, file_name, mime)
+    with _lock:
+        _jobs[job.job_id] = job
+    _pool.submit(_run, job, build)
+    return job.job_id
+
+
+def get_job(job_id):
+    # فقط کارهای همین سشن دیده می‌شوند
+    with _lock:
+        job = _jobs.get(job_id)
+    return job if job is not None and job.session_id == _session_id() else None
+
+
+def track_export(job_id):
+    # شناسه کار در سشن ثبت می‌شود تا پنل خروجی‌ها بعد از هر rerun آن را نشان دهد
+    st.session_state.setdefault("export_jobs", []).append(job_id)
+
+
+def _jobs_fragment(job_ids, was_pending):
+    jobs = [job for job in map(get_job, job_ids) if job is not None]
+    for job in jobs:
+        if job.status == "done":
+            st.download_button(
+                label=f"📥 {job.label}",
+                data=job.data,
+                file_name=job.file_name,
+                mime=job.mime,
+                key=f"export-{job.job_id}"
+            )
+        elif job.status == "error":
+            st.error(f"{job.label}: {job.error}")
+        else:
+            st.progress(job.progress, text=f"⏳ {job.label} ({job.job_id})")
+    if was_pending and all(job.finished for job in jobs):
+        # با تمام شدن همه کارها، کل صفحه یک‌بار اجرا می‌شود تا به‌روزرسانی دوره‌ای متوقف شود؛
+        # نتیجه‌هایی که فقط با کلیک دکمه ساخته می‌شوند باید در session_state بمانند (مثل Pivot در napp)
+        st.rerun()
+
+
+def export_jobs_panel():
+    # فقط همین بخش هر POLL_SECONDS ثانیه دوباره اجرا می‌شود؛ بقیه صفحه در این مدت قابل استفاده است
+    jobs = [job for job in map(get_job, st.session_state.get("export_jobs", [])) if job is not None]
+    job_ids = st.session_state["export_jobs"] = [job.job_id for job in jobs]
+    if not jobs:
+        return
+    pending = any(not job.finished for job in jobs)
+    with st.expander("📦 خروجی‌ها", expanded=True):
+        st.fragment(_jobs_fragment, run_every=POLL_SECONDS if pending else None)(job_ids, pending)
@@ -0,0 +1,157 @@
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from hsp_reader import iter_export_chunks, rows_through_user_service_id
+from hsp_schema import COLUMNS_TO_DROP, NEW_COLUMNS, STRING_COLUMNS
+from jalali_dates import convert_jalali_series
+
+# رشته‌هایی که در ستون‌های متنی خالی ('') می‌شوند
+BLANK_STRINGS = ['None', 'nan', 'NaN']
+
+# تعداد سطر هر تکه در حالت استریم
+DEFAULT_CHUNK_ROWS = 100_000
+
+
+def drop_unused_columns(df):
+    return df.drop(columns=COLUMNS_TO_DROP, errors='ignore')
+
+
+def move_cdt_first(df):
+    # انتقال ستون تاریخ "CDT" به اول جدول (اگر وجود داشت)
+    cols = list(df.columns)
+    if "CDT" in cols:
+        cols.insert(0, cols.pop(cols.index("CDT")))
+        df = df[cols]
+    return df
+
+
+def rename_columns(df):
+    df.columns = NEW_COLUMNS[:len(df.columns)]
+    return df
+
+
+def split_creat_date(df):
+    # فقط بخش تاریخ را نگه‌دار
+    df['CreatDate'] = df['CreatDate'].astype(str).str.split().str[0]
+    return df
+
+
+def convert_creat_date(df):
+    df['CreatDate'] = convert_jalali_series(df['CreatDate'])
+    return df
+
+
+def empty_price_columns(df):
+    # مقادیر ستون‌های ServicePrice و Package کاملاً خالی
+    df['ServicePrice'] = np.nan
+    df['Package'] = np.nan
+    return df
+
+
+def _blank_categorical(col):
+    # روی دسته‌ها کار می‌کند، نه تک‌تک ردیف‌ها
+    if '' not in col.cat.categories:
+        col = col.cat.add_categories([''])
+    col = col.fillna('')
+    blanks = [value for value in col.cat.categories if value in BLANK_STRINGS]
+    if blanks:
+        col = col.replace(blanks, '')
+    return col.cat.remove_unused_categories()
+
+
+def normalize_blank_strings(df):
+    for col in STRING_COLUMNS:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = _blank_categorical(df[col])
+        else:
+            df[col] = df[col].replace({None: '', 'None': '', 'nan': '', 'NaN': '', np.nan: ''})
+    return df
+
+
+def filter_new_rows(df, max_usv):
+    # فقط ردیف‌هایی که هنوز در جدول نیستند (UserServiceId بزرگ‌تر از max_usv)
+    df['UserServiceId'] = pd.to_numeric(df['UserServiceId'], errors='coerce')
+    return df[df['UserServiceId'] > max_usv].reset_index(drop=True)
+
+
+def clean_stages(max_usv):
+    # مراحل پاک‌سازی به ترتیب اجرا؛ هر مرحله یک DataFrame می‌گیرد و برمی‌گرداند
+    return [
+        ("drop_columns", drop_unused_columns),
+        ("reorder", move_cdt_first),
+        ("rename", rename_columns),
+        ("date_split", split_creat_date),
+        ("jalali", convert_creat_date),
+        ("empty_prices", empty_price_columns),
+        ("blank_strings", normalize_blank_strings),
+        ("watermark_filter", partial(filter_new_rows, max_usv=max_usv)),
+    ]
+
+
+def clean_frame(df_raw, max_usv):
+    df_clean = df_raw
+    for _, stage in clean_stages(max_usv):
+        df_clean = stage(df_clean)
+    return df_clean
+
+
+def cutoff_position(ids, user_service_id, lower_bound=False):
+    # اندیس اولین ردیف بعد از UserServiceId داده‌شده، یا None اگر پیدا نشود. اگر ستون مرتب
+    # باشد جستجوی دودویی (searchsorted) انجام می‌شود؛ وگرنه همان جستجوی خطی اولین تطابق.
+    # با lower_bound، اگر شماره دقیق نبود، از اولین شماره بزرگ‌تر ادامه داده می‌شود (فقط ستون مرتب)
+    if ids.is_monotonic_increasing:
+        values = ids.to_numpy()
+        position = int(np.searchsorted(values, user_service_id, side='left'))
+        if position < len(values) and values[position] == user_service_id:
+            return position + 1
+        return position if lower_bound else None
+    matches = np.flatnonzero((ids == user_service_id).to_numpy())
+    return int(matches[0]) + 1 if len(matches) else None
+
+
+def rows_after_user_service_id(df, user_service_id, lower_bound=False):
+    # حذف ردیف‌ها تا و شامل UserServiceId داده‌شده؛ اگر پیدا نشود None برمی‌گردد
+    position = cutoff_position(df['UserServiceId'], user_service_id, lower_bound)
+    if position is None:
+        return None
+    return df.iloc[position:].reset_index(drop=True)
+
+
+def format_gregorian_date_str(date_str):
+    try:
+        date_part = str(date_str).split(' ')[0]
+        date = pd.to_datetime(date_part, errors='coerce')
+        return date.strftime('%Y-%m-%d') if pd.notnull(date) else None
+    except:
+        return None
+
+
+def format_cdt_first(df):
+    # فرمت‌دهی تاریخ CDT و انتقال آن به ابتدای جدول
+    if 'CDT' in df.columns:
+        df['CDT'] = df['CDT'].apply(format_gregorian_date_str)
+        df = move_cdt_first(df)
+    return df
+
+
+def iter_raw_chunks(source, max_usv, chunksize=DEFAULT_CHUNK_ROWS):
+    # تکه‌های خام فایل؛ ردیف‌های ابتدای فایل که همه قبلاً در جدول‌اند، بدون خواندن کامل رد می‌شوند
+    skip_rows = rows_through_user_service_id(source, max_usv, chunksize)
+    yield from iter_export_chunks(source, chunksize, skip_rows=skip_rows)
+
+
+def iter_clean_chunks(source, max_usv, chunksize=DEFAULT_CHUNK_ROWS):
+    # فایل را تکه به تکه می‌خواند و هر تکه را جداگانه پاک‌سازی می‌کند؛
+    # در هر لحظه فقط یک تکه خام و یک تکه پاک‌شده در حافظه است
+    for chunk in iter_raw_chunks(source, max_usv, chunksize):
+        yield clean_frame(chunk, max_usv)
+
+
+def read_progress(source):
+    # درصد خوانده‌شده از فایل آپلودی، بر اساس موقعیت فعلی در فایل
+    size = getattr(source, 'size', None)
+    if not size:
+        return 0.0
+    return min(source.tell() / size, 1.0)
@@ -0,0 +1,218 @@
+import datetime
+import hashlib
+import threading
+import time
+import uuid
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from hsp_schema import HSP_SCHEMA, NEW_COLUMNS
+from hsp_tables import DATASET
+
+# دفتر ثبت فایل‌های واردشده: برای هر جدول، hash فایل، بازه UserServiceId و تعداد ردیف
+LEDGER_TABLE = f"{DATASET}.ingestion_ledger"
+
+LEDGER_SCHEMA = [
+    ("table_name", "STRING"),
+    ("file_hash", "STRING"),
+    ("file_name", "STRING"),
+    ("min_usv", "INT64"),
+    ("max_usv", "INT64"),
+    ("row_count", "INT64"),
+    ("inserted_rows", "INT64"),
+    ("ingested_at", "TIMESTAMP"),
+]
+
+_HASH_BLOCK = 1 << 20
+
+# جدول staging اگر پاک‌سازی بعد از آپلود شکست بخورد، خودش بعد از این مدت حذف می‌شود
+STAGING_EXPIRATION = datetime.timedelta(days=1)
+
+# مدت اعتبار نتیجه دفتر ثبت برای هر فایل (ثانیه)؛ تا این مدت rerunها کوئری دفتر ثبت نمی‌زنند
+LEDGER_CACHE_TTL_SECONDS = 300
+
+# کش سراسری پروسه: {(table_path, file_hash): (رکورد دفتر ثبت یا None، زمان دریافت)}
+_ledger_cache = {}
+_ledger_lock = threading.Lock()
+
+# یک قفل برای هر جدول: آپلودهای ادغام امن هم‌زمان (از چند سشن همین پروسه) پشت سر هم اجرا می‌شوند
+_merge_locks = {}
+
+
+def load_job_config(write_disposition=bigquery.WriteDisposition.WRITE_APPEND):
+    # فایل ارسالی Parquet فشرده با اسکیم صریح است (نه CSV)
+    return bigquery.LoadJobConfig(
+        write_disposition=write_disposition,
+        source_format=bigquery.SourceFormat.PARQUET,
+        schema=[bigquery.SchemaField(name, field_type) for name, field_type in HSP_SCHEMA]
+    )
+
+
+def file_sha256(file_obj):
+    # hash محتوای فایل به‌صورت تکه‌ای؛ موقعیت خواندن فایل به ابتدا برمی‌گردد
+    file_obj.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: file_obj.read(_HASH_BLOCK), b""):
+        digest.update(block)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def ensure_ledger(client):
+    columns = ", ".join(f"{name} {field_type}" for name, field_type in LEDGER_SCHEMA)
+    client.query(f"CREATE TABLE IF NOT EXISTS `{LEDGER_TABLE}` ({columns})").result()
+
+
+def find_ingested_files(client, table_path, file_hashes, ttl=LEDGER_CACHE_TTL_SECONDS):
+    # {file_hash: رکورد دفتر ثبت} برای فایل‌هایی که قبلاً در این جدول وارد شده‌اند؛ فقط hashهایی
+    # که در کش نیستند (یا کهنه شده‌اند) از دفتر ثبت پرسیده می‌شوند
+    now = time.monotonic()
+    found, missing = {}, []
+    with _ledger_lock:
+        for file_hash in dict.fromkeys(file_hashes):
+            cached = _ledger_cache.get((table_path, file_hash))
+            if cached and now - cached[1] < ttl:
+                if cached[0] is not None:
+                    found[file_hash] = cached[0]
+            else:
+                missing.append(file_hash)
+    if missing:
+        fetched = _query_ledger(client, table_path, missing)
+        with _ledger_lock:
+            for file_hash in missing:
+                _ledger_cache[(table_path, file_hash)] = (fetched.get(file_hash), now)
+        found.update(fetched)
+    return found
+
+
+def _query_ledger(client, table_path, file_hashes):
+    query = f"""
+    SELECT file_hash, file_name, min_usv, max_usv, row_count, inserted_rows, ingested_at
+    FROM `{LEDGER_TABLE}`
+    WHERE table_name = @table_name AND file_hash IN UNNEST(@file_hashes)
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY file_hash ORDER BY ingested_at) = 1
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("table_name", "STRING", table_path),
+        bigquery.ArrayQueryParameter("file_hashes", "STRING", list(file_hashes)),
+    ])
+    try:
+        rows = client.query(query, job_config=job_config).result()
+    except NotFound:
+        # دفتر ثبت هنوز ساخته نشده (اولین آپلود در حالت ادغام امن)
+        return {}
+    return {row['file_hash']: dict(row) for row in rows}
+
+
+def ledger_entry(file_hash, file_name, min_usv, max_usv, row_count):
+    return {
+        "file_hash": file_hash,
+        "file_name": file_name,
+        "min_usv": int(min_usv),
+        "max_usv": int(max_usv),
+        "row_count": int(row_count),
+    }
+
+
+def staging_path_for(table_path):
+    # هر آپلود جدول staging جداگانه دارد تا آپلودهای هم‌زمان روی هم ننویسند
+    return f"{table_path}__staging_{uuid.uuid4().hex[:12]}"
+
+
+def build_merge_query(table_path, staging_path):
+    # فقط UserServiceIdهایی که در جدول اصلی نیستند درج می‌شوند؛ تکرار آپلود یا فایل‌های
+    # هم‌پوشان ردیف تکراری نمی‌سازند. شرط BETWEEN اسکن جدول اصلی را به بازه فایل محدود می‌کند.
+    # ردیف بدون UserServiceId هیچ‌وقت با ON تطبیق نمی‌خورد و با هر تکرار دوباره درج می‌شد، پس کنار
+    # گذاشته می‌شود. فقط INSERT است تا تکرار آپلود ردیف‌های موجود را بازنویسی نکند (هزینه DML فقط
+    # برای ردیف‌های جدید)؛ آپلودهای هم‌زمان یک جدول در merge_upload پشت سر هم اجرا می‌شوند
+    columns = ", ".join(NEW_COLUMNS)
+    values = ", ".join(f"S.{name}" for name in NEW_COLUMNS)
+    return f"""
+    MERGE `{table_path}` T
+    USING (
+        SELECT * FROM `{staging_path}`
+        WHERE UserServiceId IS NOT NULL
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY UserServiceId) = 1
+    ) S
+    ON T.UserServiceId = S.UserServiceId AND T.UserServiceId BETWEEN @min_usv AND @max_usv
+    WHEN NOT MATCHED THEN
+        INSERT ({columns}) VALUES ({values})
+    """
+
+
+def record_ingestion(client, table_path, entries, inserted_rows=None):
+    # همه فایل‌های یک آپلود با یک INSERT در دفتر ثبت نوشته می‌شوند
+    query = f"""
+    INSERT INTO `{LEDGER_TABLE}` ({", ".join(name for name, _ in LEDGER_SCHEMA)})
+    SELECT @table_name, e.file_hash, e.file_name, e.min_usv, e.max_usv, e.row_count, @inserted_rows,
+           CURRENT_TIMESTAMP()
+    FROM UNNEST(@entries) e
+    """
+    structs = [
+        bigquery.StructQueryParameter(
+            None,
+            bigquery.ScalarQueryParameter("file_hash", "STRING", entry["file_hash"]),
+            bigquery.ScalarQueryParameter("file_name", "STRING", entry["file_name"]),
+            bigquery.ScalarQueryParameter("min_usv", "INT64", entry["min_usv"]),
+            bigquery.ScalarQueryParameter("max_usv", "INT64", entry["max_usv"]),
+            bigquery.ScalarQueryParameter("row_count", "INT64", entry["row_count"]),
+        )
+        for entry in entries
+    ]
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("table_name", "STRING", table_path),
+        bigquery.ScalarQueryParameter("inserted_rows", "INT64", inserted_rows),
+        bigquery.ArrayQueryParameter("entries", "STRUCT", structs),
+    ])
+    client.query(query, job_config=job_config).result()
+    with _ledger_lock:
+        for entry in entries:
+            _ledger_cache.pop((table_path, entry["file_hash"]), None)
+
+
+def create_staging_table(client, staging_path):
+    table = bigquery.Table(
+        staging_path, schema=[bigquery.SchemaField(name, field_type) for name, field_type in HSP_SCHEMA]
+    )
+    table.expires = datetime.datetime.now(datetime.timezone.utc) + STAGING_EXPIRATION
+    client.create_table(table)
+
+
+def merge_upload(client, table_path, parquet_file, entries):
+    # Parquet در جدول staging بارگذاری، با یک MERGE روی UserServiceId به جدول اصلی اضافه
+    # و در دفتر ثبت نوشته می‌شود. MERGE خودش اتمیک است؛ اگر ثبت در دفتر شکست بخورد،
+    # تکرار آپلود فقط یک MERGE بدون درج اضافه است. entries رکوردهای ledger_entry فایل‌های
+    # این آپلود است؛ تعداد ردیف‌های واقعاً درج‌شده برمی‌گردد
+    ensure_ledger(client)
+    with _ledger_lock:
+        merge_lock = _merge_locks.setdefault(table_path, threading.Lock())
+    with merge_lock:
+        # ممکن است سشن دیگری همین فایل‌ها را در حالی که این آپلود منتظر قفل بود وارد کرده باشد
+        done = _query_ledger(client, table_path, [entry["file_hash"] for entry in entries])
+        entries = [entry for entry in entries if entry["file_hash"] not in done]
+        if not entries:
+            return 0
+        return _merge_locked(client, table_path, parquet_file, entries)
+
+
+def _merge_locked(client, table_path, parquet_file, entries):
+    min_usv = min(entry["min_usv"] for entry in entries)
+    max_usv = max(entry["max_usv"] for entry in entries)
+    staging_path = staging_path_for(table_path)
+    try:
+        create_staging_table(client, staging_path)
+        client.load_table_from_file(parquet_file, staging_path, job_config=load_job_config()).result()
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("min_usv", "INT64", min_usv),
+            bigquery.ScalarQueryParameter("max_usv", "INT64", max_usv),
+        ])
+        merge_job = client.query(build_merge_query(table_path, staging_path), job_config=job_config)
+        merge_job.result()
+        dml_stats = merge_job.dml_stats
+        inserted_rows = dml_stats.inserted_row_count if dml_stats else merge_job.num_dml_affected_rows or 0
+    finally:
+        client.delete_table(staging_path, not_found_ok=True)
+    # سهم هر فایل از ردیف‌های درج‌شده مشخص نیست؛ برای آپلود چندفایلی خالی ثبت می‌شود
+    record_ingestion(client, table_path, entries, inserted_rows if len(entries) == 1 else None)
+    return inserted_rows
@@ -0,0 +1,55 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from hsp_clean import clean_frame
+from hsp_reader import read_export
+
+# تعداد پروسه‌های پاک‌سازی هم‌زمان؛ پیش‌فرض همه هسته‌ها
+MAX_FILE_WORKERS = os.cpu_count() or 1
+
+
+def clean_file(data, max_usv):
+    # خواندن و پاک‌سازی یک فایل CSV خام (در پروسه جدا اجرا می‌شود)
+    df_raw = read_export(io.BytesIO(data))
+    return len(df_raw), clean_frame(df_raw, max_usv)
+
+
+def read_file(data):
+    # خواندن یک فایل CSV خام و حذف ستون‌های اضافه، برای App.py؛ پیش‌نمایش فایل اصلی در App.py
+    # مقدار واقعی ServicePrice و SavingOffUsed را نشان می‌دهد، پس این ستون‌ها هم خوانده می‌شوند
+    df = read_export(io.BytesIO(data), keep_empty_columns=True)
+    return len(df), df
+
+
+def process_files(worker, files, *args, max_workers=MAX_FILE_WORKERS):
+    # worker را روی محتوای هر فایل اجرا می‌کند و (نام فایل، نتیجه، خطا) را به ترتیب
+    # پایان کار برمی‌گرداند. files لیستی از (نام، bytes) است؛ برای یک فایل پروسه جدا ساخته نمی‌شود
+    if len(files) == 1 or max_workers == 1:
+        for name, data in files:
+            try:
+                yield name, worker(data, *args), None
+            except Exception as e:
+                yield name, None, e
+        return
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(files))) as pool:
+        futures = {pool.submit(worker, data, *args): name for name, data in files}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+
+def merge_by_user_service_id(frames):
+    # ادغام خروجی فایل‌ها به ترتیب UserServiceId؛ ردیف‌های تکراری فایل‌های هم‌پوشان یک‌بار
+    # نگه داشته می‌شوند. (DataFrame ادغام‌شده، تعداد ردیف تکراری حذف‌شده) برمی‌گردد
+    frames = [df for df in frames if len(df)]
+    if not frames:
+        return pd.DataFrame(), 0
+    merged = pd.concat(frames, ignore_index=True)
+    merged = merged.sort_values('UserServiceId', kind='stable')
+    duplicated = merged['UserServiceId'].duplicated() & merged['UserServiceId'].notna()
+    return merged[~duplicated].reset_index(drop=True), int(duplicated.sum())
@@ -0,0 +1,35 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from hsp_schema import HSP_SCHEMA, arrow_schema
+
+# فشرده‌سازی فایل Parquet ارسالی به BigQuery
+PARQUET_COMPRESSION = "zstd"
+
+
+def to_arrow_table(df_clean):
+    # ستون‌ها یک‌بار و مستقیم به نوع نهایی تبدیل می‌شوند؛ مقدار خالی null می‌ماند و به 'nan' تبدیل نمی‌شود
+    arrays = []
+    for name, field_type in HSP_SCHEMA:
+        col = df_clean[name] if name in df_clean.columns else pd.Series(None, index=df_clean.index, dtype=object)
+        if field_type == "DATE":
+            values = pa.array(pd.to_datetime(col, errors='coerce'), from_pandas=True).cast(pa.date32())
+        elif field_type == "INTEGER":
+            values = pa.array(pd.to_numeric(col, errors='coerce').astype('Int64'), type=pa.int64(), from_pandas=True)
+        elif field_type == "FLOAT":
+            values = pa.array(pd.to_numeric(col, errors='coerce'), type=pa.float64(), from_pandas=True)
+        else:
+            values = pa.array(col.astype('string'), type=pa.string(), from_pandas=True)
+        arrays.append(values)
+    return pa.Table.from_arrays(arrays, schema=arrow_schema())
+
+
+def write_parquet(df_clean, sink, compression=PARQUET_COMPRESSION):
+    # sink می‌تواند مسیر فایل محلی یا یک بافر باینری (BytesIO / فایل موقت) باشد
+    pq.write_table(to_arrow_table(df_clean), sink, compression=compression)
+
+
+def parquet_writer(sink, compression=PARQUET_COMPRESSION):
+    # برای حالت استریم: هر تکه با writer.write_table(to_arrow_table(chunk)) یک row group می‌شود
+    return pq.ParquetWriter(sink, arrow_schema(), compression=compression)
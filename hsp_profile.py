@@ -0,0 +1,156 @@
+import cProfile
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+import streamlit as st
+
+from hsp_clean import clean_frame, clean_stages
+
+# زمان‌سنجی مراحل به‌صورت پیش‌فرض خاموش است؛ با HSP_PROFILE=1 روشن می‌شود (در UI هم قابل تغییر است)
+PROFILE_ENABLED = os.environ.get("HSP_PROFILE", "") not in ("", "0")
+
+# اگر تنظیم شود، خروجی cProfile همه مراحل در این فایل نوشته می‌شود (برای snakeviz / pstats)
+PROFILE_OUTPUT = os.environ.get("HSP_PROFILE_OUTPUT", "")
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes():
+    # حافظه فعلی پروسه (شامل حافظه native numpy / Arrow)؛ روی سیستم بدون /proc مقدار None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return None
+
+
+def _rows(value):
+    return len(value) if isinstance(value, pd.DataFrame) else None
+
+
+class StageProfiler:
+    # برای هر مرحله نام‌دار: زمان واقعی، زمان CPU، ردیف ورودی / خروجی و تغییر حافظه (RSS).
+    # مرحله‌ای که چند بار اجرا شود (مثلاً برای هر تکه در حالت استریم) در خلاصه جمع زده می‌شود
+    enabled = True
+
+    def __init__(self, profile_path=None):
+        self.records = []
+        self.profile_path = profile_path
+        self._cprofile = cProfile.Profile() if profile_path else None
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        record = {"stage": name, "rows_in": rows_in, "rows_out": None}
+        rss_start = rss_bytes()
+        profiling = self._start_cprofile()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = time.perf_counter() - wall_start
+            record["cpu_s"] = time.process_time() - cpu_start
+            if profiling:
+                self._cprofile.disable()
+            rss_end = rss_bytes()
+            record["mem_delta_mib"] = (rss_end - rss_start) / 2**20 if rss_start and rss_end else None
+            self.records.append(record)
+
+    def _start_cprofile(self):
+        if self._cprofile is None:
+            return False
+        try:
+            self._cprofile.enable()
+        except ValueError:
+            # فقط یک profiler در هر لحظه فعال می‌شود (مثلاً سشن دیگری هم‌زمان در حال پروفایل است)
+            return False
+        return True
+
+    def run(self, name, func, df, *args, **kwargs):
+        with self.stage(name, _rows(df)) as record:
+            out = func(df, *args, **kwargs)
+            record["rows_out"] = _rows(out)
+        return out
+
+    def iterate(self, name, iterable):
+        # هر next() یک اجرای مرحله name است (مثلاً خواندن هر تکه CSV)
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as record:
+                item = next(iterator, None)
+                record["rows_out"] = _rows(item) or 0
+            if item is None:
+                return
+            yield item
+
+    def clean_frame(self, df_raw, max_usv):
+        # همان hsp_clean.clean_frame، با زمان‌سنجی جداگانه هر مرحله
+        df_clean = df_raw
+        for name, stage in clean_stages(max_usv):
+            df_clean = self.run(name, stage, df_clean)
+        return df_clean
+
+    def summary(self):
+        if not self.records:
+            return pd.DataFrame()
+        df = pd.DataFrame(self.records)
+        total = lambda values: values.sum(min_count=1)
+        summary = df.groupby("stage", sort=False).agg(
+            calls=("stage", "size"),
+            wall_s=("wall_s", "sum"),
+            cpu_s=("cpu_s", "sum"),
+            rows_in=("rows_in", total),
+            rows_out=("rows_out", total),
+            mem_delta_mib=("mem_delta_mib", total),
+        ).reset_index()
+        summary["wall_pct"] = summary["wall_s"] / summary["wall_s"].sum() * 100
+        return summary.round(4)
+
+    def dump(self):
+        if self._cprofile is not None and self.records:
+            self._cprofile.dump_stats(self.profile_path)
+
+
+class _NullProfiler:
+    # همان رابط StageProfiler بدون هیچ اندازه‌گیری؛ وقتی زمان‌سنجی خاموش است هزینه‌ای ندارد
+    enabled = False
+    records = ()
+
+    def stage(self, name, rows_in=None):
+        return nullcontext({})
+
+    def run(self, name, func, df, *args, **kwargs):
+        return func(df, *args, **kwargs)
+
+    def iterate(self, name, iterable):
+        return iterable
+
+    def clean_frame(self, df_raw, max_usv):
+        return clean_frame(df_raw, max_usv)
+
+    def summary(self):
+        return pd.DataFrame()
+
+    def dump(self):
+        pass
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+def make_profiler(enabled=PROFILE_ENABLED, profile_path=PROFILE_OUTPUT or None):
+    return StageProfiler(profile_path) if enabled else NULL_PROFILER
+
+
+def profile_toggle():
+    return st.sidebar.checkbox("⏱️ زمان‌سنجی مراحل پردازش", value=PROFILE_ENABLED)
+
+
+def profile_panel(summary, title="⏱️ زمان مراحل پردازش"):
+    # جدول جمع‌بندی StageProfiler.summary() در یک بخش بازشو
+    if summary is None or summary.empty:
+        return
+    with st.expander(title):
+        st.dataframe(summary, hide_index=True)
+        st.bar_chart(summary.set_index("stage")["wall_s"])
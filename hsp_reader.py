@@ -0,0 +1,136 @@
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+from hsp_schema import COLUMNS_TO_DROP, EMPTY_RAW_COLUMNS, RAW_DTYPES
+
+# اگر pyarrow نصب باشد، فایل کامل با خواننده CSV چندنخی آن خوانده می‌شود؛ حالت تکه‌ای همیشه با موتور C است
+HAS_ARROW_CSV = importlib.util.find_spec("pyarrow") is not None
+
+# همان مقادیری که pd.read_csv به‌صورت پیش‌فرض خالی (NaN) در نظر می‌گیرد
+NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+]
+
+
+def _read_plan(source, keep_empty_columns=False):
+    # سرستون‌های فایل خوانده و موقعیت فایل به جای قبل برگردانده می‌شود
+    position = source.tell() if hasattr(source, 'seek') else None
+    header = list(pd.read_csv(source, nrows=0).columns)
+    if position is not None:
+        source.seek(position)
+    columns = [col for col in header if col not in COLUMNS_TO_DROP]
+    usecols = [col for col in columns if keep_empty_columns or col not in EMPTY_RAW_COLUMNS]
+    dtype = {col: RAW_DTYPES[col] for col in usecols if col in RAW_DTYPES}
+    return position, header, columns, usecols, dtype
+
+
+def _restore_columns(df, columns):
+    # ستون‌های خالی‌شدنی با NaN ساخته می‌شوند و ترتیب ستون‌ها همان فایل خام است
+    for col in columns:
+        if col not in df.columns:
+            df[col] = np.nan
+    return df[columns]
+
+
+def _read_arrow(source, usecols, dtype):
+    # نوع ستون‌های متنی صریح داده می‌شود تا pyarrow آن‌ها را تاریخ تشخیص ندهد؛
+    # ستون‌های category مستقیم dictionary-encoded خوانده می‌شوند
+    import pyarrow as pa
+    from pyarrow import csv
+
+    column_types = {
+        col: pa.dictionary(pa.int32(), pa.string()) if kind == "category" else pa.string()
+        for col, kind in dtype.items()
+    }
+    convert_options = csv.ConvertOptions(
+        include_columns=usecols,
+        column_types=column_types,
+        null_values=NA_VALUES,
+        strings_can_be_null=True,
+    )
+    df = csv.read_csv(source, convert_options=convert_options).to_pandas()
+    for col, kind in dtype.items():
+        if kind != "category":
+            df[col] = df[col].astype(kind)
+    return df
+
+
+def read_export(source, keep_empty_columns=False):
+    # معادل drop_unused_columns(pd.read_csv(source))، اما فقط ستون‌های لازم و
+    # با نوع نهایی‌شان در همان بار اول خوانده می‌شوند. با keep_empty_columns ستون‌های
+    # EMPTY_RAW_COLUMNS هم با مقدار اصلی‌شان خوانده می‌شوند (برای نمایش فایل اصلی)
+    position, _, columns, usecols, dtype = _read_plan(source, keep_empty_columns)
+    rewindable = position is not None or not hasattr(source, 'read')
+    df = None
+    if HAS_ARROW_CSV and rewindable:
+        try:
+            df = _read_arrow(source, usecols, dtype)
+        except Exception:
+            # فایلی که pyarrow نمی‌پذیرد (مثلاً تعداد ستون نامنظم) با موتور C دوباره خوانده می‌شود
+            if position is not None:
+                source.seek(position)
+    if df is None:
+        df = pd.read_csv(source, usecols=usecols, dtype=dtype)
+    return _restore_columns(df, columns)
+
+
+def _leading_rows_through(id_chunks, user_service_id):
+    skipped = 0
+    for ids in id_chunks:
+        ids = pd.to_numeric(ids, errors='coerce')
+        if (ids <= user_service_id).all():
+            skipped += len(ids)
+            continue
+        if ids.is_monotonic_increasing:
+            skipped += int(np.searchsorted(ids.to_numpy(), user_service_id, side='right'))
+        break
+    return skipped
+
+
+def _arrow_id_chunks(source):
+    from pyarrow import csv
+
+    convert_options = csv.ConvertOptions(include_columns=['UserServiceId'], null_values=NA_VALUES)
+    for batch in csv.open_csv(source, convert_options=convert_options):
+        yield batch.column(0).to_pandas()
+
+
+def _c_id_chunks(source, chunksize):
+    with pd.read_csv(source, usecols=['UserServiceId'], chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk['UserServiceId']
+
+
+def rows_through_user_service_id(source, user_service_id, chunksize):
+    # تعداد ردیف‌های ابتدای فایل که همه UserServiceIdشان <= user_service_id است؛ فقط ستون
+    # UserServiceId خوانده می‌شود و با رسیدن به اولین تکه‌ای که ردیف بزرگ‌تر دارد متوقف می‌شود.
+    # داخل همان تکه، اگر مرتب باشد، با جستجوی دودویی جلوتر می‌رود
+    position = source.tell() if hasattr(source, 'seek') else None
+    rewindable = position is not None or not hasattr(source, 'read')
+    if HAS_ARROW_CSV and rewindable:
+        try:
+            return _leading_rows_through(_arrow_id_chunks(source), user_service_id)
+        except Exception:
+            # این شمارش فقط بهینه‌سازی است؛ اگر pyarrow فایل را نپذیرد با موتور C تکرار می‌شود
+            pass
+        finally:
+            if position is not None:
+                source.seek(position)
+    skipped = _leading_rows_through(_c_id_chunks(source, chunksize), user_service_id)
+    if position is not None:
+        source.seek(position)
+    return skipped
+
+
+def iter_export_chunks(source, chunksize, skip_rows=0):
+    # نسخه تکه‌ای read_export برای حالت استریم؛ skip_rows ردیف اول فایل بدون تبدیل رد می‌شوند
+    _, header, columns, usecols, dtype = _read_plan(source)
+    options = dict(usecols=usecols, dtype=dtype, chunksize=chunksize)
+    if skip_rows:
+        options.update(skiprows=skip_rows + 1, header=None, names=header)
+    with pd.read_csv(source, **options) as reader:
+        for chunk in reader:
+            yield _restore_columns(chunk, columns)
@@ -0,0 +1,52 @@
+import pyarrow as pa
+
+# اسکیم جدول‌های HSP: تنها محل تعریف نام و نوع ستون‌ها
+HSP_SCHEMA = [
+    ("CreatDate", "DATE"),
+    ("UserServiceId", "INTEGER"),
+    ("Creator", "STRING"),
+    ("ServiceName", "STRING"),
+    ("Username", "STRING"),
+    ("ServiceStatus", "STRING"),
+    ("ServicePrice", "FLOAT"),
+    ("Package", "FLOAT"),
+    ("StartDate", "STRING"),
+    ("EndDate", "STRING"),
+]
+
+NEW_COLUMNS = [name for name, _ in HSP_SCHEMA]
+
+STRING_COLUMNS = [name for name, field_type in HSP_SCHEMA if field_type == "STRING"]
+
+# ستون‌هایی از خروجی خام که در جدول نگه داشته نمی‌شوند و اصلاً خوانده نمی‌شوند
+COLUMNS_TO_DROP = [
+    'PayPlan', 'DirectOff', 'VAT', 'PayPrice', 'Off', 'SavingOff',
+    'CancelDT', 'ReturnPrice', 'InstallmentNo', 'InstallmentPeriod',
+    'InstallmentFirstCash', 'ServiceIsDel'
+]
+
+# نوع ستون‌های نگه‌داشته‌شده خروجی خام هنگام خواندن CSV؛ ستونی که اینجا نیست
+# (UserServiceId) نوعش از روی داده تشخیص داده می‌شود
+RAW_DTYPES = {
+    "CDT": "str",
+    "Creator": "category",
+    "ServiceName": "category",
+    "Username": "str",
+    "ServiceStatus": "category",
+    "StartDate": "str",
+    "EndDate": "str",
+}
+
+# ستون‌هایی که در همه مسیرها خالی (NaN) می‌شوند؛ خوانده نمی‌شوند و فقط جایشان خالی ساخته می‌شود
+EMPTY_RAW_COLUMNS = ["ServicePrice", "SavingOffUsed"]
+
+_ARROW_TYPES = {
+    "DATE": pa.date32(),
+    "INTEGER": pa.int64(),
+    "FLOAT": pa.float64(),
+    "STRING": pa.string(),
+}
+
+
+def arrow_schema():
+    return pa.schema([pa.field(name, _ARROW_TYPES[field_type]) for name, field_type in HSP_SCHEMA])
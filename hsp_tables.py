@@ -0,0 +1,15 @@
+# نام دیتاست و جدول‌های HSP؛ بدون وابستگی به streamlit تا اسکریپت‌های خط فرمان (test.py،
+# local_mirror، hsp_provision) هم بتوانند از آن استفاده کنند
+DATASET = "frsphotspots.HSP"
+
+TABLE_NAMES = [
+    "hspdata",
+    "hspdata_02",
+    "hspdata_ghor",
+    "hspdata_ac",
+    "test"
+]
+
+
+def table_path_for(table_name):
+    return f"{DATASET}.{table_name}"
@@ -0,0 +1,127 @@
+import datetime
+from functools import lru_cache
+
+import jdatetime
+import numpy as np
+import pandas as pd
+
+# بازه سال‌های شمسی که جدول روزشمار برای آن از قبل ساخته می‌شود
+JALALI_TABLE_YEARS = (1300, 1500)
+# بازه سال‌های میلادی که به‌صورت برداری بررسی می‌شوند
+GREGORIAN_VECTOR_YEARS = (1900, 2200)
+
+# ordinal روز 1970-01-01 برای تبدیل به datetime64[D]
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+_DATE_PATTERN = r'^([0-9]{1,5})/([0-9]{1,2})/([0-9]{1,2})$'
+
+_GREGORIAN_MONTH_DAYS = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def to_gregorian_if_jalali(date_str):
+    # نسخه سطر به سطر (مرجع رفتار و مسیر جایگزین برای ورودی‌های غیرعادی)
+    try:
+        if not isinstance(date_str, str):
+            return date_str
+        if date_str.startswith('14'):
+            parts = date_str.replace('-', '/').split('/')
+            if len(parts) == 3:
+                jy, jm, jd = map(int, parts)
+                gdate = jdatetime.date(jy, jm, jd).togregorian()
+                return gdate.strftime('%Y-%m-%d')
+        elif date_str.startswith('20'):
+            parts = date_str.replace('-', '/').split('/')
+            if len(parts) == 3:
+                gy, gm, gd = map(int, parts)
+                return datetime.date(gy, gm, gd).strftime('%Y-%m-%d')
+        return date_str
+    except Exception:
+        return date_str
+
+
+@lru_cache(maxsize=None)
+def _jalali_year_table():
+    # برای هر سال شمسی: ordinal میلادیِ اول فروردین و کبیسه بودن سال
+    # (با خود jdatetime ساخته می‌شود تا نتیجه دقیقاً مثل نسخه قبلی باشد)
+    first_year, last_year = JALALI_TABLE_YEARS
+    years = range(first_year, last_year + 1)
+    nowruz = np.array([jdatetime.date(y, 1, 1).togregorian().toordinal() for y in years], dtype=np.int64)
+    leap = np.array([jdatetime.date(y, 1, 1).isleap() for y in years], dtype=bool)
+    return nowruz, leap
+
+
+def _ordinals_to_strings(ordinals):
+    days = (ordinals - _EPOCH_ORDINAL).astype('datetime64[D]')
+    return np.datetime_as_string(days, unit='D').astype(object)
+
+
+def _jalali_ordinals(y, m, d):
+    nowruz, leap = _jalali_year_table()
+    first_year, last_year = JALALI_TABLE_YEARS
+    in_range = (y >= first_year) & (y <= last_year)
+    idx = np.where(in_range, y - first_year, 0)
+    month_days = np.where(m <= 6, 31, np.where(m <= 11, 30, np.where(leap[idx], 30, 29)))
+    valid = in_range & (m >= 1) & (m <= 12) & (d >= 1) & (d <= month_days)
+    day_of_year = np.where(m <= 6, (m - 1) * 31, 186 + (m - 7) * 30) + d - 1
+    return nowruz[idx] + day_of_year, valid, in_range
+
+
+def _gregorian_ordinals(y, m, d):
+    first_year, last_year = GREGORIAN_VECTOR_YEARS
+    in_range = (y >= first_year) & (y <= last_year)
+    month_ok = (m >= 1) & (m <= 12)
+    is_leap = (y % 4 == 0) & ((y % 100 != 0) | (y % 400 == 0))
+    month_days = _GREGORIAN_MONTH_DAYS[np.where(month_ok, m, 0)] + ((m == 2) & is_leap)
+    valid = in_range & month_ok & (d >= 1) & (d <= month_days)
+    months = (np.where(valid, y, 1970) - 1970) * 12 + np.where(valid, m, 1) - 1
+    days = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) + np.where(valid, d, 1) - 1
+    return days + _EPOCH_ORDINAL, valid, in_range
+
+
+def _convert_unique(values):
+    str_pos = np.flatnonzero([type(v) is str for v in values])
+    if not len(str_pos):
+        return values
+
+    text = pd.Series(values[str_pos], dtype=object)
+    is_jalali = text.str.startswith('14').to_numpy()
+    candidates = is_jalali | text.str.startswith('20').to_numpy()
+    cand_pos = str_pos[candidates]
+
+    parts = text[candidates].str.replace('-', '/', regex=False).str.extract(_DATE_PATTERN)
+    matched = parts[0].notna().to_numpy()
+    ymd = parts[matched].astype(np.int64).to_numpy()
+    row_pos = cand_pos[matched]
+    jalali_rows = is_jalali[candidates][matched]
+
+    # ردیف‌هایی که مسیر برداری تکلیفشان را روشن نمی‌کند (سال خارج از جدول، ارقام غیرلاتین و ...)
+    undecided = [cand_pos[~matched]]
+    for rows, to_ordinals in ((jalali_rows, _jalali_ordinals), (~jalali_rows, _gregorian_ordinals)):
+        if not rows.any():
+            continue
+        ordinals, valid, in_range = to_ordinals(ymd[rows, 0], ymd[rows, 1], ymd[rows, 2])
+        positions = row_pos[rows]
+        values[positions[valid]] = _ordinals_to_strings(ordinals[valid])
+        undecided.append(positions[~in_range])
+
+    # این ردیف‌ها با همان تابع سطر به سطر بررسی می‌شوند تا رفتار قبلی حفظ شود
+    for pos in np.concatenate(undecided):
+        values[pos] = to_gregorian_if_jalali(values[pos])
+    return values
+
+
+def convert_jalali_series(dates):
+    # تبدیل برداری ستون تاریخ: شمسی (14xx) و میلادی (20xx) به 'YYYY-MM-DD'
+    # ورودی‌های نامعتبر یا غیر رشته‌ای بدون تغییر برمی‌گردند.
+    # تعداد تاریخ‌های یکتا در یک خروجی ماهانه چند صد تاست؛ پس تبدیل فقط روی مقادیر یکتا انجام می‌شود
+    values = dates.to_numpy(dtype=object)
+    codes, uniques = pd.factorize(values)
+    uniques = np.asarray(uniques, dtype=object)
+    if not len(uniques):
+        return pd.Series(values.copy(), index=dates.index, name=dates.name)
+    unique_is_str = np.array([type(v) is str for v in uniques], dtype=bool)
+    converted = _convert_unique(uniques.copy())
+    take = (codes >= 0) & unique_is_str[codes]
+    result = values.copy()
+    result[take] = converted[codes[take]]
+    return pd.Series(result, index=dates.index, name=dates.name)
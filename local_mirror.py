@@ -0,0 +1,315 @@
+# نسخه محلی جدول‌های HSP: فایل‌های Parquet پارتیشن‌شده بر اساس ماه CreatDate، که به‌صورت
+# افزایشی (بر اساس بزرگ‌ترین UserServiceId) از BigQuery همگام می‌شوند، و یک موتور SQL
+# درون‌پروسه‌ای (duckdb، در requirements.txt؛ بدون آن اپ‌ها فقط از BigQuery می‌خوانند) که همان کوئری‌های گزارش را اجرا می‌کند.
+# اجرا از ریشه مخزن:
+#   python -m local_mirror                   # همگام‌سازی همه جدول‌ها
+#   python -m local_mirror --tables hspdata
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from google.api_core.exceptions import NotFound
+
+from bq_fetch import as_backend
+from daily_rollup import RAW_AGGREGATES, ROLLUP_STATE_TABLE, rollup_path_for
+from hsp_parquet import PARQUET_COMPRESSION
+from hsp_schema import HSP_SCHEMA, arrow_schema
+from hsp_tables import DATASET, TABLE_NAMES, table_path_for
+
+HAS_DUCKDB = importlib.util.find_spec("duckdb") is not None
+
+# پوشه نسخه محلی
+MIRROR_ROOT = os.environ.get("HSP_MIRROR_DIR", "hsp_mirror")
+
+PARTITION_COLUMN = "CreatMonth"
+
+# تعداد ردیف هر فایل Parquet در همگام‌سازی (و حداکثر ردیف‌هایی که هم‌زمان در حافظه است)
+SYNC_FILE_ROWS = 500_000
+
+# تعداد نتیجه‌های باز (open_result) که نگه داشته می‌شوند؛ قدیمی‌ترها حذف می‌شوند
+MAX_OPEN_RESULTS = 32
+
+# شماره نتیجه‌ها در کل پروسه یکتاست (کلید کش صفحه‌ها در report_queries)
+_result_ids = itertools.count(1)
+_STATE_FILE = "_mirror.json"
+
+_DUCKDB_TYPES = {"DATE": "DATE", "INTEGER": "BIGINT", "STRING": "VARCHAR", "FLOAT": "DOUBLE"}
+
+_BACKTICKS = re.compile(r"`([^`]*)`")
+_IN_UNNEST = re.compile(r"(\w+)\s+IN\s+UNNEST\(\s*@(\w+)\s*\)", re.IGNORECASE)
+_PARAMS = re.compile(r"@(\w+)")
+
+
+def _table_dir(root, table_name):
+    return os.path.join(root, table_name)
+
+
+def read_state(root, table_name):
+    try:
+        with open(os.path.join(_table_dir(root, table_name), _STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"max_usv": 0, "rows": 0}
+
+
+def _write_state(root, table_name, state):
+    path = os.path.join(_table_dir(root, table_name), _STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def _part_files(root, table_name):
+    table_dir = _table_dir(root, table_name)
+    for dirpath, _, filenames in os.walk(table_dir):
+        for filename in filenames:
+            if filename.endswith(".parquet"):
+                yield os.path.join(dirpath, filename)
+
+
+def _remove_orphans(root, table_name, max_usv):
+    # فایل‌های همگام‌سازی نیمه‌کاره (بعد از آخرین وضعیت ثبت‌شده) حذف می‌شوند تا ردیف تکراری نماند
+    for path in _part_files(root, table_name):
+        match = re.match(r"usv-(\d+)-", os.path.basename(path))
+        if match and int(match.group(1)) > max_usv:
+            os.remove(path)
+
+
+def sync_table(client, table_name, root=MIRROR_ROOT, file_rows=SYNC_FILE_ROWS):
+    # فقط ردیف‌های با UserServiceId بزرگ‌تر از نسخه محلی گرفته و در پارتیشن ماه خودشان نوشته می‌شوند.
+    # نتیجه صفحه‌به‌صفحه خوانده و هر file_rows ردیف یک‌بار نوشته می‌شود، پس کل دلتا در حافظه نمی‌ماند
+    os.makedirs(_table_dir(root, table_name), exist_ok=True)
+    state = read_state(root, table_name)
+    last_usv = state["max_usv"]
+    _remove_orphans(root, table_name, last_usv)
+
+    from google.cloud import bigquery
+    query = f"SELECT * FROM `{table_path_for(table_name)}` WHERE UserServiceId > @last_usv"
+    params = [bigquery.ScalarQueryParameter("last_usv", "INT64", last_usv)]
+    backend = as_backend(client)
+    if hasattr(backend, "query_arrow_batches"):
+        batches = backend.query_arrow_batches(query, params, file_rows)
+    else:
+        batches = backend.query_arrow(query, params).to_batches()
+
+    rows, new_max, pending, pending_rows = 0, last_usv, [], 0
+    for part, batch in enumerate(itertools.chain(batches, [None])):
+        if batch is not None and batch.num_rows:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+        if pending and (batch is None or pending_rows >= file_rows):
+            table = pa.Table.from_batches(pending)
+            new_max = max(new_max, pc.max(table["UserServiceId"]).as_py() or last_usv)
+            _write_part(table, root, table_name, f"usv-{last_usv + 1}-p{part}")
+            rows += table.num_rows
+            pending, pending_rows = [], 0
+    if not rows:
+        return 0
+    _write_state(root, table_name, {
+        "max_usv": new_max,
+        "rows": state["rows"] + rows,
+        "synced_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    return rows
+
+
+def _write_part(table, root, table_name, basename):
+    table = table.cast(arrow_schema()) if set(table.column_names) == set(arrow_schema().names) else table
+    month = pc.fill_null(pc.strftime(table["CreatDate"], format="%Y-%m"), "unknown")
+    pq.write_to_dataset(
+        table.append_column(PARTITION_COLUMN, month),
+        _table_dir(root, table_name),
+        partition_cols=[PARTITION_COLUMN],
+        basename_template=f"{basename}-{{i}}.parquet",
+        compression=PARQUET_COMPRESSION,
+    )
+
+
+def mirror_available(root=MIRROR_ROOT):
+    return HAS_DUCKDB and any(read_state(root, name)["max_usv"] for name in TABLE_NAMES)
+
+
+def translate_query(query, params):
+    # گویش BigQuery به duckdb: بدون backtick، پارامتر $name و list_contains به جای IN UNNEST
+    query = _BACKTICKS.sub(r"\1", query)
+    query = _IN_UNNEST.sub(r"list_contains($\2, \1)", query)
+    query = _PARAMS.sub(r"$\1", query)
+    values = {}
+    for param in params:
+        values[param.name] = list(param.values) if hasattr(param, "values") else param.value
+    return query, values
+
+
+def _normalize_types(table):
+    # SUM روی عدد صحیح در duckdb از نوع decimal برمی‌گردد؛ مثل BigQuery به int64 / float64 تبدیل می‌شود
+    for i, field in enumerate(table.schema):
+        if pa.types.is_decimal(field.type):
+            target = pa.int64() if field.type.scale == 0 else pa.float64()
+            table = table.set_column(i, field.name, table.column(i).cast(target))
+    return table
+
+
+class MirrorBackend:
+    # همان رابط query_arrow در bq_fetch؛ نام جدول‌های BigQuery (frsphotspots.HSP.<table>) به
+    # view روی فایل‌های Parquet محلی اشاره می‌کنند، پس کوئری‌های گزارش بدون تغییر اجرا می‌شوند
+
+    def __init__(self, root=MIRROR_ROOT, table_names=TABLE_NAMES):
+        import duckdb
+
+        self.root = root
+        self.table_names = list(table_names)
+        self._lock = threading.Lock()
+        self._con = duckdb.connect()
+        catalog, schema = DATASET.split(".")
+        self._con.execute(f"ATTACH ':memory:' AS {catalog}")
+        self._con.execute(f"CREATE SCHEMA {catalog}.{schema}")
+        self._con.execute("CREATE TYPE FLOAT64 AS DOUBLE")
+        self._con.execute("CREATE SCHEMA _results")
+        self._results = deque()
+        self._states = None
+        self.refresh()
+
+    def _state_signature(self):
+        signature = []
+        for name in self.table_names:
+            try:
+                signature.append(os.stat(os.path.join(_table_dir(self.root, name), _STATE_FILE)).st_mtime_ns)
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _refresh_if_changed(self):
+        # backend با cache_resource بین سشن‌ها می‌ماند؛ هر همگام‌سازی (حتی در پروسه دیگر) فایل وضعیت
+        # را عوض می‌کند و قبل از کوئری بعدی viewها دوباره ساخته می‌شوند
+        if self._state_signature() != self._states:
+            self.refresh()
+
+    def refresh(self):
+        # view هر جدول دوباره ساخته می‌شود (بعد از همگام‌سازی، جدولی که فایل نداشت فایل‌دار می‌شود)
+        with self._lock:
+            self._states = self._state_signature()
+            for name in self.table_names:
+                self._create_views(name)
+            # view تجمیع روزانه همیشه همه ردیف‌های محلی را می‌بیند، پس وضعیت آن هم از خود ردیف‌ها خوانده
+            # می‌شود (نه عدد ثابت لحظه ساخت view) و بعد از همگام‌سازی هم دقیق می‌ماند
+            states = " UNION ALL ".join(
+                f"SELECT '{table_path_for(name)}' AS table_name, IFNULL(MAX(UserServiceId), 0) AS max_usv, "
+                f"COUNT(*) AS row_count FROM {table_path_for(name)}"
+                for name in self.table_names
+            )
+            self._con.execute(f"CREATE OR REPLACE VIEW {ROLLUP_STATE_TABLE} AS {states}")
+
+    def _create_views(self, name):
+        table_path = table_path_for(name)
+        files = list(_part_files(self.root, name))
+        if files:
+            pattern = os.path.join(_table_dir(self.root, name), "**", "*.parquet").replace("'", "''")
+            source = f"SELECT * EXCLUDE ({PARTITION_COLUMN}) FROM read_parquet('{pattern}', hive_partitioning = true)"
+        else:
+            columns = ", ".join(
+                f"CAST(NULL AS {_DUCKDB_TYPES[field_type]}) AS {column}" for column, field_type in HSP_SCHEMA
+            )
+            source = f"SELECT {columns} WHERE FALSE"
+        self._con.execute(f"CREATE OR REPLACE VIEW {table_path} AS {source}")
+        # جدول تجمیع روزانه هم از همین ردیف‌ها ساخته می‌شود (daily_rollup.daily_source)
+        self._con.execute(f"""
+        CREATE OR REPLACE VIEW {rollup_path_for(table_path)} AS
+        SELECT CreatDate, Creator, ServiceName,{RAW_AGGREGATES}
+        FROM {table_path}
+        GROUP BY CreatDate, Creator, ServiceName
+        """)
+
+    def watermark(self, table_path):
+        return read_state(self.root, table_path.rsplit(".", 1)[-1])["max_usv"]
+
+    def query_arrow(self, query, params=()):
+        self._refresh_if_changed()
+        query, values = translate_query(query, params)
+        with self._lock:
+            cursor = self._con.cursor()
+        try:
+            result = cursor.execute(query, values)
+            to_arrow = getattr(result, "to_arrow_table", None) or result.fetch_arrow_table
+            return _normalize_types(to_arrow())
+        finally:
+            cursor.close()
+
+    def open_result(self, query, params=()):
+        # مثل جدول نتیجه job در BigQuery: نتیجه مرتب یک‌بار در یک جدول ذخیره و بعداً با rowid خوانده می‌شود
+        self._refresh_if_changed()
+        query, values = translate_query(query, params)
+        with self._lock:
+            result = f"_results.r{next(_result_ids)}"
+            self._results.append(result)
+            expired = self._results.popleft() if len(self._results) > MAX_OPEN_RESULTS else None
+            cursor = self._con.cursor()
+        try:
+            cursor.execute(f"CREATE TABLE {result} AS {query}", values)
+            if expired:
+                cursor.execute(f"DROP TABLE IF EXISTS {expired}")
+        finally:
+            cursor.close()
+        return result
+
+    def read_result(self, result, start, page_size):
+        import duckdb
+
+        with self._lock:
+            if result not in self._results:
+                raise NotFound(f"نتیجه {result} دیگر موجود نیست")
+            cursor = self._con.cursor()
+        try:
+            rows = cursor.execute(
+                f"SELECT * FROM {result} WHERE rowid >= $start AND rowid < $end ORDER BY rowid",
+                {"start": start, "end": start + page_size},
+            )
+            to_arrow = getattr(rows, "to_arrow_table", None) or rows.fetch_arrow_table
+            return _normalize_types(to_arrow())
+        except duckdb.CatalogException as e:
+            raise NotFound(str(e))
+        finally:
+            cursor.close()
+
+    def query_arrow_batches(self, query, params=(), page_size=None):
+        self._refresh_if_changed()
+        query, values = translate_query(query, params)
+        with self._lock:
+            cursor = self._con.cursor()
+        try:
+            result = cursor.execute(query, values)
+            to_reader = getattr(result, "to_arrow_reader", None) or result.fetch_record_batch
+            reader = to_reader(page_size or 1_000_000)
+            for batch in reader:
+                yield from _normalize_types(pa.Table.from_batches([batch])).to_batches()
+        finally:
+            cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tables', nargs='+', default=TABLE_NAMES)
+    parser.add_argument('--root', default=MIRROR_ROOT)
+    args = parser.parse_args()
+
+    from google.cloud import bigquery
+    from bq_metrics import InstrumentedClient
+    client = InstrumentedClient(bigquery.Client())
+    for name in args.tables:
+        started = time.perf_counter()
+        rows = sync_table(client, name, args.root)
+        state = read_state(args.root, name)
+        print(f"{name}: {rows} ردیف جدید در {time.perf_counter() - started:.1f}s "
+              f"(کل {state['rows']}، تا UserServiceId {state['max_usv']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from fpdf import FPDF
+
+from result_cache import ResultCache
+
+FONT_SIZE = 8
+LINE_HEIGHT = 6.35
+MARGIN = 2
+PAGE_WIDTH = 210  # Portrait A4
+
+HEADER_FILL = (220, 220, 220)
+TOTAL_FILL = (200, 210, 210)  # حدود ۱۰٪ تیره‌تر از ردیف معمولی
+STRIPE_FILLS = ((255, 255, 255), (240, 240, 240))
+DRAW_COLOR = (51, 51, 51)  # 20% سیاه
+
+# PDFهای ساخته‌شده، مشترک بین سشن‌ها؛ کلید هش محتوای جدول ورودی است
+PDF_CACHE_MAX_BYTES = 256 * 2**20
+pdf_cache = ResultCache(max_bytes=PDF_CACHE_MAX_BYTES)
+
+
+def safe_text(text):
+    try:
+        return str(text).encode('latin-1', 'ignore').decode('latin-1')
+    except Exception:
+        return ''
+
+
+def _set_font(pdf):
+    try:
+        pdf.set_font("Arial", size=FONT_SIZE)
+    except Exception:
+        pdf.set_font("helvetica", size=FONT_SIZE)
+
+
+@lru_cache(maxsize=None)
+def glyph_widths():
+    # عرض هر کاراکتر latin-1 یک‌بار از خود fpdf خوانده و کش می‌شود
+    pdf = FPDF()
+    _set_font(pdf)
+    return tuple(pdf.get_string_width(chr(i)) for i in range(256))
+
+
+def text_width(text):
+    widths = glyph_widths()
+    return sum(widths[ord(c)] for c in text)
+
+
+def _max_text_width(texts):
+    # عرض همه مقادیر یکتا به‌صورت برداری: کاراکترها پشت سر هم به جدول عرض نگاشت
+    # و با جمع تجمعی برای هر رشته جمع زده می‌شوند
+    unique = [text for text in set(texts) if text]
+    if not unique:
+        return 0.0
+    codes = np.frombuffer(''.join(unique).encode('latin-1'), dtype=np.uint8)
+    cumulative = np.concatenate(([0.0], np.cumsum(np.asarray(glyph_widths())[codes])))
+    ends = np.cumsum([len(text) for text in unique])
+    starts = ends - [len(text) for text in unique]
+    return float((cumulative[ends] - cumulative[starts]).max())
+
+
+def column_texts(series):
+    # متن نهایی سلول‌های یک ستون؛ تبدیل به رشته فقط برای مقادیر یکتا انجام می‌شود
+    if series.dtype == object:
+        memo = {}
+        texts = []
+        for value in series.tolist():
+            key = (type(value), value)
+            text = memo.get(key)
+            if text is None:
+                text = safe_text(value) if value is not None else ""
+                memo[key] = text
+            texts.append(text)
+        return texts
+    codes, uniques = pd.factorize(series)
+    unique_texts = np.array([safe_text(v) for v in uniques] + [""], dtype=object)
+    na = codes < 0
+    if na.any():
+        unique_texts[-1] = safe_text(series[na].iloc[0])
+    return unique_texts[codes].tolist()
+
+
+class _ChunkedBuffer:
+    # buffer رشته‌ای fpdf 1.7.2 با هر += کل سند را کپی می‌کند و برای گزارش‌های
+    # بزرگ درجه دو می‌شود؛ این کلاس تکه‌ها را در لیست نگه می‌دارد
+
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+
+    def __iadd__(self, text):
+        self.parts.append(text)
+        self.length += len(text)
+        return self
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        return ''.join(self.parts)
+
+
+class TablePDF(FPDF):
+    def __init__(self, headers, col_widths, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.headers = headers
+        self.col_widths = col_widths
+        # مسیر سریع ردیف‌ها فقط برای fpdf 1.7.2 (buffer رشته‌ای) فعال می‌شود
+        self.fast_rows = isinstance(self.buffer, str)
+        if self.fast_rows:
+            self.buffer = _ChunkedBuffer()
+
+    def header(self):
+        self.set_fill_color(*HEADER_FILL)
+        self.set_text_color(0)
+        _set_font(self)
+        for width, text in zip(self.col_widths, self.headers):
+            self.cell(width, LINE_HEIGHT, text, border=1, align='C', fill=True)
+        self.ln(LINE_HEIGHT)
+
+    def table_row(self, texts):
+        # معادل cell(..., border=1, align='L', fill=True) برای همه سلول‌های ردیف و سپس ln؛
+        # خروجی همان است ولی کل ردیف با یک _out نوشته می‌شود
+        if not self.fast_rows or self.unifontsubset or self.underline or self.ws:
+            for width, text in zip(self.col_widths, texts):
+                self.cell(width, LINE_HEIGHT, text, border=1, align='L', fill=True)
+            self.ln(LINE_HEIGHT)
+            return
+        if self.y + LINE_HEIGHT > self.page_break_trigger and not self.in_footer and self.accept_page_break():
+            self.add_page(self.cur_orientation)
+        k = self.k
+        top = (self.h - self.y) * k
+        height = -LINE_HEIGHT * k
+        text_y = (self.h - (self.y + .5 * LINE_HEIGHT + .3 * self.font_size)) * k
+        color_start, color_end = ('q ' + self.text_color + ' ', ' Q') if self.color_flag else ('', '')
+        x = self.x
+        ops = []
+        for width, text in zip(self.col_widths, texts):
+            op = '%.2f %.2f %.2f %.2f re B ' % (x * k, top, width * k, height)
+            if text:
+                op += '%sBT %.2f %.2f Td (%s) Tj ET%s' % (
+                    color_start, (x + self.c_margin) * k, text_y, self._escape(text), color_end)
+            ops.append(op)
+            x += width
+        self._out('\n'.join(ops))
+        self.lasth = LINE_HEIGHT
+        self.x = self.l_margin
+        self.y += LINE_HEIGHT
+
+
+def _default_total_rows(first_column):
+    return [text.strip().endswith("Total") or text.strip().lower() == "grand total" for text in first_column]
+
+
+def render_pdf(df, total_rows=None):
+    # جدول را در حافظه به PDF تبدیل می‌کند و bytes برمی‌گرداند (بدون فایل موقت روی دیسک)
+    if df.empty:
+        return b""
+    headers = [safe_text(col) for col in df.columns]
+    columns = [column_texts(df[col]) for col in df.columns]
+    if total_rows is None:
+        total_rows = _default_total_rows(columns[0])
+
+    usable_width = PAGE_WIDTH - 2 * MARGIN
+    max_lens = [
+        max(text_width(header) + 2, _max_text_width(texts))
+        for header, texts in zip(headers, columns)
+    ]
+    total_width = sum(max_lens)
+    col_widths = [w * usable_width / total_width for w in max_lens]
+
+    pdf = TablePDF(headers, col_widths, orientation='P', unit='mm', format='A4')
+    pdf.set_auto_page_break(auto=True, margin=MARGIN)
+    pdf.set_margins(MARGIN, MARGIN, MARGIN)
+    pdf.add_page()
+    _set_font(pdf)
+    pdf.set_draw_color(*DRAW_COLOR)
+
+    current_fill = None
+    for i, (row, is_total) in enumerate(zip(zip(*columns), total_rows)):
+        fill_color = TOTAL_FILL if is_total else STRIPE_FILLS[i % 2]
+        if fill_color != current_fill:
+            pdf.set_fill_color(*fill_color)
+            current_fill = fill_color
+        pdf.table_row(row)
+
+    output = pdf.output(dest='S')
+    if isinstance(output, _ChunkedBuffer):
+        output = str(output)
+    return output.encode('latin-1') if isinstance(output, str) else bytes(output)
+
+
+def pdf_input_hash(df, total_rows=None):
+    digest = hashlib.sha1(repr((list(df.columns), total_rows)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def render_pdf_shared(df, total_rows=None):
+    # مثل render_pdf، اما PDF جدول یکسان فقط یک‌بار ساخته می‌شود (هم‌زمان یا از کش)
+    return pdf_cache.get_or_compute(("pdf", pdf_input_hash(df, total_rows)), lambda: render_pdf(df, total_rows))
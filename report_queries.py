@@ -0,0 +1,272 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from bq_client import get_watermark
+from bq_fetch import fetch_dataframe, fetch_result_page, iter_dataframes, open_result
+from daily_rollup import daily_source, rollup_is_exact
+from result_cache import ResultCache
+
+# کش سراسری نتایج گزارش‌ها (بین سشن‌ها و rerunها مشترک)
+report_cache = ResultCache()
+
+# تعداد ردیف هر صفحه نمایش گزارش و هر صفحه خروجی کامل (CSV / PDF)
+PAGE_SIZE = 500
+EXPORT_PAGE_SIZE = 50000
+
+# گرفتن صفحه بعد در پس‌زمینه، هم‌زمان با نمایش / پردازش صفحه فعلی
+PREFETCH_WORKERS = 4
+_prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+
+# عبارت‌های تجمیع روی جدول خام و روی جدول تجمیع روزانه (daily_rollup)
+RAW_MEASURES = {
+    "row_count": "COUNT(*)",
+    "usv_count": "COUNT(UserServiceId)",
+    "package_sum": "SUM(CAST(Package AS FLOAT64))",
+}
+DAILY_MEASURES = {
+    "row_count": "SUM(row_count)",
+    "usv_count": "SUM(usv_count)",
+    "package_sum": "IF(SUM(package_count) = 0, NULL, SUM(package_sum))",
+}
+
+
+@dataclass(frozen=True)
+class ReportFilters:
+    # مجموعه نرمال‌شده فیلترهای گزارش؛ کلید کش نتایج است
+    table_path: str
+    creators: tuple
+    numeric_op: str = None
+    numeric_values: tuple = ()
+    date_op: str = None
+    date_values: tuple = ()
+
+    @classmethod
+    def create(cls, table_path, creators, numeric_op=None, numeric_values=(), date_op=None, date_values=()):
+        return cls(
+            table_path=table_path,
+            creators=tuple(sorted(set(creators))),
+            numeric_op=numeric_op,
+            numeric_values=tuple(int(v) for v in numeric_values) if numeric_op else (),
+            date_op=date_op,
+            date_values=tuple(date_values) if date_op else (),
+        )
+
+    def where(self):
+        conditions, params = [], []
+        if self.creators:
+            conditions.append("Creator IN UNNEST(@creator_list)")
+            params.append(bigquery.ArrayQueryParameter("creator_list", "STRING", list(self.creators)))
+        if self.numeric_op == "BETWEEN":
+            conditions.append("UserServiceId BETWEEN @usv1 AND @usv2")
+            params += [
+                bigquery.ScalarQueryParameter("usv1", "INT64", self.numeric_values[0]),
+                bigquery.ScalarQueryParameter("usv2", "INT64", self.numeric_values[1])
+            ]
+        elif self.numeric_op:
+            conditions.append(f"UserServiceId {self.numeric_op} @usv1")
+            params.append(bigquery.ScalarQueryParameter("usv1", "INT64", self.numeric_values[0]))
+        if self.date_op == "BETWEEN":
+            conditions.append("CreatDate BETWEEN @dt1 AND @dt2")
+            params += [
+                bigquery.ScalarQueryParameter("dt1", "DATE", self.date_values[0]),
+                bigquery.ScalarQueryParameter("dt2", "DATE", self.date_values[1])
+            ]
+        elif self.date_op:
+            conditions.append(f"CreatDate {self.date_op} @dt1")
+            params.append(bigquery.ScalarQueryParameter("dt1", "DATE", self.date_values[0]))
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where_clause, params
+
+    @property
+    def rollup_compatible(self):
+        # جدول تجمیع روزانه فقط Creator و CreatDate دارد؛ فیلتر بازه UserServiceId جدول خام می‌خواهد
+        return self.numeric_op is None
+
+
+def _current_watermark(client, table_path):
+    # نسخه محلی (local_mirror) watermark خودش را دارد و با نتایج BigQuery یکی حساب نمی‌شود
+    if hasattr(client, "watermark"):
+        return ("mirror", client.watermark(table_path))
+    try:
+        return get_watermark(client, table_path)
+    except Exception:
+        return None
+
+
+def cached_report(client, kind, filters, query, params):
+    # اجرای کوئری گزارش با کش؛ اگر جدول از زمان ذخیره آپدیت شده باشد، نتیجه دوباره گرفته می‌شود
+    # درخواست‌های هم‌زمان همان کوئری و پارامترها (مثلاً از چند سشن) یک job مشترک دارند
+    return _cached_compute(
+        client, kind, filters, lambda: fetch_dataframe(client, query, params),
+        flight_key=(query, tuple(repr(p) for p in params))
+    )
+
+
+def _cached_compute(client, kind, filters, compute, flight_key):
+    watermark = _current_watermark(client, filters.table_path)
+    return report_cache.get_or_compute((kind, filters), compute, watermark, flight_key=flight_key + (watermark,))
+
+
+# ترتیب ردیف‌های گزارش؛ ردیف‌های بدون UserServiceId در انتها می‌آیند
+PAGE_ORDER = "UserServiceId ASC NULLS LAST, Username, CreatDate"
+
+
+def build_rows_query(filters):
+    where_clause, params = filters.where()
+    return f"SELECT * FROM {filters.table_path} {where_clause} ORDER BY {PAGE_ORDER}", params
+
+
+def open_rows(client, filters):
+    # کوئری ردیف‌ها یک‌بار اجرا و نتیجه‌اش (جدول نتیجه job) صفحه‌به‌صفحه خوانده می‌شود. صفحه‌ها
+    # شماره ردیف در همان نتیجه‌اند، پس ردیف تکراری یا بدون شناسه جا نمی‌افتد و همه صفحه‌های یک
+    # سشن از یک نسخه داده‌اند
+    return open_result(client, *build_rows_query(filters))
+
+
+def next_cursor(page, page_size, cursor=0):
+    # شماره اولین ردیف صفحه بعد؛ None یعنی این صفحه آخر است
+    if len(page) < page_size:
+        return None
+    return cursor + len(page)
+
+
+def fetch_page(client, result, cursor=0, page_size=PAGE_SIZE):
+    # محتوای یک صفحه از نتیجه ثابت تغییر نمی‌کند؛ watermark لازم نیست
+    return report_cache.get_or_compute(
+        ("page", result, cursor, page_size), lambda: fetch_result_page(client, result, cursor, page_size)
+    )
+
+
+def prefetch_page(client, result, cursor, page_size=PAGE_SIZE):
+    # صفحه بعد در پس‌زمینه در کش گذاشته می‌شود تا کلیک «صفحه بعد» منتظر BigQuery نماند
+    return _prefetch_pool.submit(fetch_page, client, result, cursor, page_size)
+
+
+def iter_pages(client, filters, page_size=EXPORT_PAGE_SIZE):
+    # همه ردیف‌ها (بدون کش، برای خروجی کامل) از نتیجه یک کوئری، صفحه‌به‌صفحه؛ صفحه بعد
+    # هم‌زمان با پردازش صفحه فعلی خوانده می‌شود
+    pages = iter_dataframes(client, *build_rows_query(filters), page_size=page_size)
+    future = _prefetch_pool.submit(next, pages, None)
+    while True:
+        page = future.result()
+        if page is None:
+            return
+        future = _prefetch_pool.submit(next, pages, None)
+        yield page
+
+
+def iter_pages_with_progress(client, filters, progress=None, page_size=EXPORT_PAGE_SIZE):
+    # مثل iter_pages؛ progress(کسر) بعد از هر صفحه با نسبت ردیف‌های خوانده‌شده به کل صدا زده می‌شود
+    if progress is None:
+        yield from iter_pages(client, filters, page_size)
+        return
+    summary = _aggregate_report(client, "summary", filters, build_summary_query)
+    total = int(summary['row_count'].iloc[0]) if not summary.empty else 0
+    done = 0
+    for page in iter_pages(client, filters, page_size):
+        done += len(page)
+        if total:
+            progress(min(done / total, 1.0))
+        yield page
+
+
+def export_rows_csv(client, filters, progress=None):
+    # فایل ساخته‌شده هم در کش مشترک می‌ماند؛ دانلود هم‌زمان همان گزارش از چند سشن یک‌بار ساخته می‌شود
+    def build():
+        buffer = io.StringIO()
+        for i, page in enumerate(iter_pages_with_progress(client, filters, progress)):
+            page.to_csv(buffer, index=False, header=i == 0)
+        return buffer.getvalue().encode('utf-8')
+
+    return report_cache.get_or_compute(("rows_csv", filters), build, _current_watermark(client, filters.table_path))
+
+
+def _aggregate_report(client, kind, filters, build_query):
+    # گزارش‌های تجمیعی وقتی جدول تجمیع روزانه همه ردیف‌های جدول خام را حساب کرده باشد از آن خوانده
+    # می‌شوند؛ در غیر این صورت (آپلود هنوز تجمیع نشده، جدول روزانه ساخته نشده یا فیلتر UserServiceId)
+    # همان کوئری روی جدول خام اجرا می‌شود، پس نتیجه همیشه دقیق است
+    where_clause, params = filters.where()
+
+    def compute():
+        if filters.rollup_compatible and _rollup_ready(client, filters.table_path):
+            query = build_query(daily_source(filters.table_path), where_clause, DAILY_MEASURES)
+        else:
+            query = build_query(filters.table_path, where_clause, RAW_MEASURES)
+        return fetch_dataframe(client, query, params)
+
+    return _cached_compute(client, kind, filters, compute, flight_key=("aggregate", kind, filters))
+
+
+def _rollup_ready(client, table_path):
+    try:
+        return rollup_is_exact(client, table_path)
+    except NotFound:
+        return False
+
+
+def build_summary_query(source, where_clause, measures):
+    return f"""
+    SELECT
+      IFNULL({measures['row_count']}, 0) AS row_count,
+      IFNULL({measures['usv_count']}, 0) AS count_usv,
+      IFNULL({measures['package_sum']}, 0) AS total_package
+    FROM {source}
+    {where_clause}
+    """
+
+
+def fetch_summary(client, filters):
+    # تجمیع در خود BigQuery انجام می‌شود و فقط یک ردیف برمی‌گردد
+    summary = _aggregate_report(client, "summary", filters, build_summary_query)
+    if summary.empty or not summary['row_count'].iloc[0]:
+        return None
+    return summary['total_package'].iloc[0], summary['count_usv'].iloc[0]
+
+
+def build_pivot_query(source, where_clause, measures, per_creator):
+    # جمع هر Creator و جمع کل در خود BigQuery با ROLLUP ساخته می‌شود؛ برای یک Creator
+    # فقط جمع کل (GROUPING SETS). ستون is_total ردیف‌های جمع را برای رنگ‌آمیزی PDF مشخص می‌کند
+    grouping = "ROLLUP(Creator, ServiceName)" if per_creator else "GROUPING SETS ((Creator, ServiceName), ())"
+    return f"""
+    WITH rolled AS (
+      SELECT
+        Creator,
+        ServiceName,
+        {measures['usv_count']} AS UserServiceId_count,
+        {measures['package_sum']} AS Package_sum,
+        GROUPING(Creator) AS creator_total,
+        GROUPING(ServiceName) AS service_total
+      FROM {source}
+      {where_clause}
+      GROUP BY {grouping}
+    )
+    SELECT
+      CASE
+        WHEN creator_total = 1 THEN 'Grand Total'
+        WHEN service_total = 1 THEN CONCAT(Creator, ' - Total')
+        ELSE Creator
+      END AS Creator,
+      IF(service_total = 1, '', ServiceName) AS ServiceName,
+      UserServiceId_count,
+      IF(service_total = 1, IFNULL(Package_sum, 0), Package_sum) AS Package_sum,
+      service_total = 1 AS is_total
+    FROM rolled
+    ORDER BY creator_total, rolled.Creator, service_total, rolled.ServiceName
+    """
+
+
+def fetch_pivot(client, filters, per_creator):
+    # (جدول Pivot همراه ردیف‌های جمع، لیست پرچم ردیف‌های جمع) برمی‌گردد
+    kind = "pivot_by_creator" if per_creator else "pivot"
+    pivot_df = _aggregate_report(
+        client, kind, filters,
+        lambda source, where_clause, measures: build_pivot_query(source, where_clause, measures, per_creator)
+    )
+    if pivot_df.empty or pivot_df['is_total'].all():
+        # فقط ردیف جمع کل (بدون داده) یعنی نتیجه‌ای یافت نشده
+        return pivot_df.iloc[0:0].drop(columns=['is_total']), []
+    return pivot_df.drop(columns=['is_total']).reset_index(drop=True), pivot_df['is_total'].astype(bool).tolist()
@@ -0,0 +1,138 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import pandas as pd
+
+# پیش‌فرض‌های کش نتایج گزارش‌ها
+RESULT_CACHE_MAX_BYTES = 512 * 2**20
+RESULT_CACHE_TTL_SECONDS = 15 * 60
+
+
+def estimate_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class SingleFlight:
+    # درخواست‌های هم‌زمان با کلید یکسان (از هر سشن / نخ) فقط یک‌بار اجرا می‌شوند؛
+    # بقیه منتظر همان اجرا می‌مانند و همان نتیجه (یا همان خطا) را می‌گیرند
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, compute):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class ResultCache:
+    # کش LRU با محدودیت حجم (بایت) و TTL؛ هر ورودی watermark جدول را هم نگه می‌دارد
+    # و اگر watermark فعلی جدول با آن فرق کند، ورودی کهنه حساب می‌شود
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, ttl=RESULT_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key, watermark):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, stored_at, stored_watermark = entry
+        if time.monotonic() - stored_at >= self.ttl or stored_watermark != watermark:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key, watermark=None):
+        with self._lock:
+            value = self._lookup(key, watermark)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def get_or_compute(self, key, compute, watermark=None, flight_key=None):
+        # در صورت نبودن در کش، compute فقط یک‌بار برای همه درخواست‌های هم‌زمان اجرا می‌شود.
+        # flight_key (پیش‌فرض: key و watermark) مشخص می‌کند کدام درخواست‌ها یکسان‌اند
+        value = self.get(key, watermark)
+        if value is not None:
+            return value
+
+        def compute_and_store():
+            # ممکن است اجرای قبلی همین کلید بین get بالا و اینجا تمام شده باشد
+            with self._lock:
+                value = self._lookup(key, watermark)
+            if value is None:
+                value = compute()
+                self.put(key, value, watermark)
+            return value
+
+        return self._flights.do(flight_key if flight_key is not None else (key, watermark), compute_and_store)
+
+    def put(self, key, value, watermark=None):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, time.monotonic(), watermark)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "shared_in_flight": self._flights.shared,
+            }
+
+    def _remove(self, key):
+        _, size, _, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,52 @@
+import datetime
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import report_queries
+from hsp_schema import arrow_schema
+from result_cache import ResultCache
+
+TABLE_PATH = "frsphotspots.HSP.hspdata"
+
+
+class SourceTable:
+    # به جای BigQuery در sync_table: ردیف‌های بعد از @last_usv از یک جدول Arrow
+
+    def __init__(self, table):
+        self.table = table
+
+    def query_arrow(self, query, params=()):
+        last_usv = params[0].value
+        return self.table.filter(pc.greater(self.table["UserServiceId"], last_usv))
+
+
+def make_rows(ids, usernames=None, dates=None, creators=None, packages=None):
+    n = len(ids)
+    return pd.DataFrame({
+        "CreatDate": dates if dates is not None else [datetime.date(2024, 1, 1 + i % 28) for i in range(n)],
+        "UserServiceId": pd.array(ids, dtype="Int64"),
+        "Creator": creators if creators is not None else ["a"] * n,
+        "ServiceName": ["s1" if i % 2 else "s2" for i in range(n)],
+        "Username": usernames if usernames is not None else [f"u{i}" for i in range(n)],
+        "ServiceStatus": "active",
+        "ServicePrice": 1.0,
+        "Package": packages if packages is not None else [1.5] * n,
+        "StartDate": "2024-01-01",
+        "EndDate": "2024-02-01",
+    })
+
+
+def to_arrow(df):
+    return pa.Table.from_pandas(df, schema=arrow_schema(), preserve_index=False)
+
+
+@pytest.fixture(autouse=True)
+def fresh_report_cache(monkeypatch):
+    monkeypatch.setattr(report_queries, "report_cache", ResultCache())
@@ -0,0 +1,90 @@
+import json
+import types
+
+import pytest
+from google.cloud import bigquery
+
+import bq_metrics
+from bq_metrics import InstrumentedClient, QueryBudgetExceeded, fingerprint
+
+
+class FakeJob:
+    def __init__(self, rows=None, error=None, dry_run_bytes=None):
+        self.job_id = "job-1"
+        self.total_bytes_processed = dry_run_bytes if dry_run_bytes is not None else 2048
+        self.total_bytes_billed = 10 * 2**20
+        self.slot_millis = 7
+        self.cache_hit = False
+        self._rows, self._error = rows, error
+
+    def result(self):
+        if self._error:
+            raise self._error
+        return types.SimpleNamespace(total_rows=len(self._rows))
+
+
+class FakeClient:
+    def __init__(self, rows=(), error=None, estimated=100):
+        self.rows, self.error, self.estimated = list(rows), error, estimated
+        self.executed = []
+
+    def query(self, query, job_config=None):
+        if job_config is not None and job_config.dry_run:
+            return FakeJob(dry_run_bytes=self.estimated)
+        self.executed.append(query)
+        return FakeJob(self.rows, self.error)
+
+
+@pytest.fixture
+def log_path(tmp_path, monkeypatch):
+    path = tmp_path / "queries.jsonl"
+    monkeypatch.setattr(bq_metrics, "QUERY_LOG_PATH", str(path))
+    monkeypatch.setattr(bq_metrics, "_recent", bq_metrics.deque(maxlen=bq_metrics.RECENT_METRICS))
+    return path
+
+
+def test_fingerprint_ignores_literals_and_spacing():
+    assert fingerprint("SELECT * FROM t WHERE id > 10 AND name = 'ali'") == \
+        fingerprint("SELECT *\n  FROM t WHERE id > 99 AND name = 'o\\'x'")
+    assert fingerprint("SELECT a FROM t") != fingerprint("SELECT b FROM t")
+
+
+def test_query_is_recorded_with_params_and_cost(log_path):
+    client = InstrumentedClient(FakeClient(rows=[1, 2, 3]), budget_bytes=None)
+    config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("usv1", "INT64", 5),
+        bigquery.ArrayQueryParameter("creator_list", "STRING", [f"c{i}" for i in range(25)]),
+    ])
+    job = client.query("SELECT *   FROM t WHERE id > @usv1", job_config=config)
+    assert job.job_id == "job-1"
+    job.result()
+    job.result()
+
+    (entry,) = bq_metrics.recent_metrics()
+    assert entry["kind"] == "query" and entry["rows"] == 3 and entry["error"] is None
+    assert entry["sql"] == "SELECT * FROM t WHERE id > @usv1"
+    assert entry["bytes_billed"] == 10 * 2**20 and entry["slot_ms"] == 7
+    assert entry["params"]["usv1"] == 5
+    assert entry["params"]["creator_list"][-1] == "... +5"
+    assert [json.loads(line)["fingerprint"] for line in log_path.read_text().splitlines()] == [entry["fingerprint"]]
+
+
+def test_failed_query_is_recorded(log_path):
+    client = InstrumentedClient(FakeClient(error=RuntimeError("boom")), budget_bytes=None)
+    with pytest.raises(RuntimeError):
+        client.query("SELECT 1").result()
+    assert bq_metrics.recent_metrics()[-1]["error"] == "boom"
+
+
+def test_query_over_budget_is_refused_before_running(log_path):
+    fake = FakeClient(estimated=5 * 2**30)
+    client = InstrumentedClient(fake, budget_bytes=2**30)
+    with pytest.raises(QueryBudgetExceeded):
+        client.query("SELECT * FROM big")
+    assert fake.executed == []
+    entry = bq_metrics.recent_metrics()[-1]
+    assert entry["kind"] == "refused" and entry["estimated_bytes"] == 5 * 2**30
+
+    fake.estimated = 2**20
+    client.query("SELECT * FROM small").result()
+    assert fake.executed == ["SELECT * FROM small"]
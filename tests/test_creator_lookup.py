@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("duckdb")
+
+import local_mirror
+from conftest import SourceTable, make_rows, to_arrow
+from creator_lookup import find_creators_batched, find_creators_concurrent, find_creators_data
+
+TABLES = ["hspdata", "hspdata_02"]
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    # ali در هر دو جدول، zahra فقط در جدول دوم
+    first = make_rows([1, 2, 3], creators=["ali", "ali", "mohsen"])
+    second = make_rows([10, 11, 12], creators=["ali", "zahra", "zahra"])
+    for name, rows in zip(TABLES, (first, second)):
+        local_mirror.sync_table(SourceTable(to_arrow(rows)), name, str(tmp_path))
+    return local_mirror.MirrorBackend(str(tmp_path), TABLES)
+
+
+def summarize(results):
+    return {
+        creator: (sorted(df['UserServiceId'].tolist()) if not df.empty else [], table)
+        for creator, (df, table) in results.items()
+    }
+
+
+def test_batched_lookup_takes_each_creator_from_its_first_table(mirror):
+    results = find_creators_data(mirror, ["zahra", "ali", "nobody", "ali"], TABLES, [], [])
+    assert list(results) == ["zahra", "ali", "nobody"]
+    assert summarize(results) == {
+        "zahra": ([11, 12], "hspdata_02"),
+        "ali": ([1, 2], "hspdata"),
+        "nobody": ([], None),
+    }
+    assert "_priority" not in results["ali"][0].columns
+
+
+def test_batched_and_concurrent_lookups_agree(mirror):
+    conditions, params = ["UserServiceId >= 2"], []
+    batched = find_creators_batched(mirror, ["ali", "zahra", "mohsen"], TABLES, conditions, params)
+    concurrent = find_creators_concurrent(mirror, ["ali", "zahra", "mohsen"], TABLES, conditions, params)
+    assert summarize(batched) == summarize(concurrent) == {
+        "ali": ([2], "hspdata"),
+        "zahra": ([11, 12], "hspdata_02"),
+        "mohsen": ([3], "hspdata"),
+    }
@@ -0,0 +1,92 @@
+import pytest
+
+pytest.importorskip("duckdb")
+
+import local_mirror
+from conftest import TABLE_PATH, SourceTable, make_rows, to_arrow
+from report_queries import ReportFilters, fetch_pivot, fetch_summary
+
+
+@pytest.fixture
+def rows():
+    ids = list(range(1, 61))
+    creators = ["a" if i % 3 else "b" for i in ids]
+    packages = [float(i % 4) or None for i in ids]
+    return make_rows(ids, creators=creators, packages=packages)
+
+
+def expected(df, creators):
+    subset = df[df["Creator"].isin(creators)]
+    return subset["Package"].astype(float).sum(), subset["UserServiceId"].count()
+
+
+def test_summary_after_resync_counts_new_rows_once(tmp_path, rows):
+    root = str(tmp_path)
+    source = to_arrow(rows)
+    local_mirror.sync_table(SourceTable(source.slice(0, 25)), "hspdata", root)
+    mirror = local_mirror.MirrorBackend(root)
+    filters = ReportFilters.create(TABLE_PATH, ["a", "b"])
+    assert fetch_summary(mirror, filters) == pytest.approx(expected(rows.iloc[:25], ["a", "b"]))
+
+    # همان backend (مثل get_mirror با cache_resource) بعد از همگام‌سازی دوباره
+    local_mirror.sync_table(SourceTable(source), "hspdata", root)
+    assert fetch_summary(mirror, filters) == pytest.approx(expected(rows, ["a", "b"]))
+
+
+def test_pivot_after_resync(tmp_path, rows):
+    root = str(tmp_path)
+    source = to_arrow(rows)
+    local_mirror.sync_table(SourceTable(source.slice(0, 30)), "hspdata", root)
+    mirror = local_mirror.MirrorBackend(root)
+    local_mirror.sync_table(SourceTable(source), "hspdata", root)
+
+    pivot, flags = fetch_pivot(mirror, ReportFilters.create(TABLE_PATH, ["a", "b"]), per_creator=True)
+    grand_total = pivot[pivot["Creator"] == "Grand Total"].iloc[0]
+    total_package, count_usv = expected(rows, ["a", "b"])
+    assert grand_total["UserServiceId_count"] == count_usv
+    assert grand_total["Package_sum"] == pytest.approx(total_package)
+    assert flags == [name.endswith("Total") for name in pivot["Creator"]]
+
+
+def test_rollup_state_follows_mirror(tmp_path, rows):
+    root = str(tmp_path)
+    local_mirror.sync_table(SourceTable(to_arrow(rows).slice(0, 10)), "hspdata", root)
+    mirror = local_mirror.MirrorBackend(root)
+    local_mirror.sync_table(SourceTable(to_arrow(rows)), "hspdata", root)
+    state = mirror.query_arrow("SELECT max_usv FROM frsphotspots.HSP.daily_rollup_state "
+                               f"WHERE table_name = '{TABLE_PATH}'")
+    assert state.column("max_usv").to_pylist() == [60]
+
+
+def set_rollup(mirror, daily_sql, counted_rows):
+    # جدول روزانه و وضعیت آن مثل BigQuery (جدا از ردیف‌های خام) جایگزین می‌شوند
+    mirror._con.execute(f"CREATE OR REPLACE VIEW frsphotspots.HSP.hspdata_daily AS {daily_sql}")
+    mirror._con.execute(
+        "CREATE OR REPLACE VIEW frsphotspots.HSP.daily_rollup_state AS "
+        f"SELECT '{TABLE_PATH}' AS table_name, 0 AS max_usv, {counted_rows} AS row_count"
+    )
+
+
+DAILY_FROM_RAW = (
+    "SELECT CreatDate, Creator, ServiceName, COUNT(*) AS row_count, COUNT(UserServiceId) AS usv_count, "
+    "IFNULL(SUM(Package), 0) AS package_sum, COUNT(Package) AS package_count "
+    f"FROM {TABLE_PATH} WHERE UserServiceId <= 40 GROUP BY ALL"
+)
+
+
+def test_summary_falls_back_to_raw_when_rollup_missed_rows(tmp_path, rows):
+    # ردیف‌های بالای ۴۰ (و ردیف بدون شناسه / زیر watermark) در جدول روزانه حساب نشده‌اند
+    local_mirror.sync_table(SourceTable(to_arrow(rows)), "hspdata", str(tmp_path))
+    mirror = local_mirror.MirrorBackend(str(tmp_path))
+    set_rollup(mirror, DAILY_FROM_RAW, 40)
+    filters = ReportFilters.create(TABLE_PATH, ["a", "b"])
+    assert fetch_summary(mirror, filters) == pytest.approx(expected(rows, ["a", "b"]))
+
+
+def test_summary_reads_rollup_when_it_counted_every_row(tmp_path, rows):
+    local_mirror.sync_table(SourceTable(to_arrow(rows)), "hspdata", str(tmp_path))
+    mirror = local_mirror.MirrorBackend(str(tmp_path))
+    # جدول روزانه عمداً فقط ۴۰ ردیف اول را دارد تا معلوم شود از کدام منبع خوانده شده
+    set_rollup(mirror, DAILY_FROM_RAW, len(rows))
+    filters = ReportFilters.create(TABLE_PATH, ["a", "b"])
+    assert fetch_summary(mirror, filters) == pytest.approx(expected(rows.iloc[:40], ["a", "b"]))
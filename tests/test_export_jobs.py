@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import export_jobs
+from export_jobs import get_job, submit_export
+
+
+@pytest.fixture
+def session(monkeypatch):
+    # جایگزین st.session_state: سشن فعلی قابل تغییر است
+    current = {"id": "s1"}
+    monkeypatch.setattr(export_jobs, "_session_id", lambda: current["id"])
+    monkeypatch.setattr(export_jobs, "_jobs", {})
+    return current
+
+
+def wait_finished(job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not export_jobs._jobs[job_id].finished:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return export_jobs._jobs[job_id]
+
+
+def test_export_runs_in_background_and_reports_progress(session):
+    release = threading.Event()
+    seen = []
+
+    def build(progress):
+        release.wait(5)
+        progress(1.7)
+        seen.append(export_jobs._jobs[job_id].progress)
+        progress(0.5)
+        seen.append(export_jobs._jobs[job_id].progress)
+        return b"a,b\n"
+
+    job_id = submit_export("CSV", "out.csv", "text/csv", build)
+    # submit_export منتظر ساخت فایل نمی‌ماند
+    assert get_job(job_id).status in ("queued", "running")
+    release.set()
+    job = wait_finished(job_id)
+    assert (job.status, job.data, job.progress, job.size) == ("done", b"a,b\n", 1.0, 4)
+    assert seen == [1.0, 0.5]
+
+
+def test_failed_export_keeps_the_error(session):
+    def build(progress):
+        raise ValueError("no rows")
+
+    job = wait_finished(submit_export("PDF", "out.pdf", "application/pdf", build))
+    assert (job.status, job.error, job.data) == ("error", "no rows", None)
+
+
+def test_jobs_are_private_to_their_session(session):
+    job_id = submit_export("CSV", "out.csv", "text/csv", lambda progress: b"x")
+    wait_finished(job_id)
+    session["id"] = "s2"
+    assert get_job(job_id) is None
+    session["id"] = "s1"
+    assert get_job(job_id).data == b"x"
+
+
+def test_old_finished_jobs_are_forgotten(session, monkeypatch):
+    monkeypatch.setattr(export_jobs, "MAX_FINISHED_JOBS", 2)
+    job_ids = []
+    for i in range(4):
+        job_ids.append(submit_export("CSV", "out.csv", "text/csv", lambda progress, i=i: bytes([i])))
+        wait_finished(job_ids[-1])
+        time.sleep(0.01)
+    assert [get_job(job_id) is not None for job_id in job_ids] == [False, False, True, True]
+
+    monkeypatch.setattr(export_jobs, "MAX_EXPORT_BYTES", 1)
+    wait_finished(submit_export("CSV", "out.csv", "text/csv", lambda progress: b"zz"))
+    # از حجم کل عبور شده؛ فقط تازه‌ترین فایل (حتی اگر به‌تنهایی بزرگ‌تر باشد) می‌ماند
+    assert len(export_jobs._jobs) == 1
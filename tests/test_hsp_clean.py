@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from hsp_clean import cutoff_position, rows_after_user_service_id
+
+
+def linear_cutoff(ids, user_service_id):
+    # رفتار قبلی: اولین ردیف با همین شناسه
+    for i, value in enumerate(ids):
+        if value == user_service_id:
+            return i + 1
+    return None
+
+
+SORTED = [1, 2, 2, 5, 8, 13]
+UNSORTED = [5, 1, 8, 2, 13, 2]
+
+
+@pytest.mark.parametrize("ids", [SORTED, UNSORTED], ids=["sorted", "unsorted"])
+@pytest.mark.parametrize("user_service_id", [0, 1, 2, 5, 6, 13, 20])
+def test_cutoff_matches_linear_search(ids, user_service_id):
+    assert cutoff_position(pd.Series(ids), user_service_id) == linear_cutoff(ids, user_service_id)
+
+
+def test_lower_bound_continues_after_missing_id_on_sorted_input():
+    ids = pd.Series(SORTED)
+    assert cutoff_position(ids, 6, lower_bound=True) == 4
+    assert cutoff_position(ids, 0, lower_bound=True) == 0
+    assert cutoff_position(ids, 20, lower_bound=True) == 6
+    # شماره موجود مثل حالت عادی بعد از اولین تطابق
+    assert cutoff_position(ids, 2, lower_bound=True) == 2
+    # ستون نامرتب جستجوی دودویی ندارد؛ فقط تطابق دقیق
+    assert cutoff_position(pd.Series(UNSORTED), 6, lower_bound=True) is None
+
+
+def test_rows_after_user_service_id():
+    df = pd.DataFrame({"UserServiceId": SORTED, "n": range(len(SORTED))})
+    assert rows_after_user_service_id(df, 5)["n"].tolist() == [4, 5]
+    assert rows_after_user_service_id(df, 6) is None
+    assert rows_after_user_service_id(df, 6, lower_bound=True)["UserServiceId"].tolist() == [8, 13]
@@ -0,0 +1,90 @@
+import io
+import threading
+import time
+from types import SimpleNamespace
+
+import hsp_ingest
+from hsp_ingest import build_merge_query, ledger_entry, merge_upload
+
+TABLE_PATH = "frsphotspots.HSP.hspdata"
+
+
+class FakeJob:
+    def __init__(self, rows=(), inserted=0):
+        self.rows = list(rows)
+        self.dml_stats = SimpleNamespace(inserted_row_count=inserted)
+        self.num_dml_affected_rows = inserted
+
+    def result(self):
+        return self.rows
+
+
+class FakeClient:
+    # دفتر ثبت در حافظه؛ MERGE کمی طول می‌کشد تا هم‌پوشانی آپلودهای هم‌زمان دیده شود
+
+    def __init__(self):
+        self.ledger = {}
+        self.merges = []
+        self.active = 0
+        self.max_active = 0
+
+    def query(self, query, job_config=None):
+        params = {p.name: p for p in getattr(job_config, "query_parameters", [])}
+        if "file_hashes" in params:
+            return FakeJob({"file_hash": h} for h in params["file_hashes"].values if h in self.ledger)
+        if query.lstrip().startswith("MERGE"):
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            time.sleep(0.05)
+            self.merges.append(query)
+            self.active -= 1
+            return FakeJob(inserted=3)
+        if "entries" in params:
+            for struct in params["entries"].values:
+                self.ledger[struct.struct_values["file_hash"]] = struct.struct_values
+        return FakeJob()
+
+    def create_table(self, table):
+        pass
+
+    def load_table_from_file(self, file_obj, destination, job_config=None):
+        return FakeJob()
+
+    def delete_table(self, table, not_found_ok=False):
+        pass
+
+
+def test_merge_is_insert_only():
+    query = build_merge_query(TABLE_PATH, f"{TABLE_PATH}__staging_x")
+    assert "WHEN MATCHED" not in query
+    assert "UPDATE" not in query
+    assert "WHEN NOT MATCHED THEN\n        INSERT" in query
+    assert "T.UserServiceId BETWEEN @min_usv AND @max_usv" in query
+    assert "WHERE UserServiceId IS NOT NULL" in query
+    assert "QUALIFY ROW_NUMBER() OVER (PARTITION BY UserServiceId) = 1" in query
+
+
+def test_merge_upload_skips_files_already_in_ledger():
+    client = FakeClient()
+    entries = [ledger_entry("h1", "a.csv", 1, 3, 3)]
+    assert merge_upload(client, TABLE_PATH, io.BytesIO(b""), entries) == 3
+    assert merge_upload(client, TABLE_PATH, io.BytesIO(b""), entries) == 0
+    assert len(client.merges) == 1
+
+
+def test_concurrent_uploads_of_one_table_run_one_at_a_time(monkeypatch):
+    monkeypatch.setattr(hsp_ingest, "_merge_locks", {})
+    client = FakeClient()
+    inserted = []
+
+    def upload(i):
+        entries = [ledger_entry(f"h{i}", f"{i}.csv", 1, 3, 3)]
+        inserted.append(merge_upload(client, TABLE_PATH, io.BytesIO(b""), entries))
+
+    threads = [threading.Thread(target=upload, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert inserted == [3, 3, 3, 3]
+    assert client.max_active == 1
@@ -0,0 +1,54 @@
+import io
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_raw_csv
+from hsp_clean import clean_frame
+from hsp_parallel import clean_file, merge_by_user_service_id, process_files
+from hsp_reader import read_export
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    path = tmp_path / "raw.csv"
+    write_raw_csv(60, str(path), seed=3)
+    return path.read_bytes()
+
+
+def split_csv(data, ranges):
+    # چند فایل از ردیف‌های یک CSV؛ بازه‌ها می‌توانند هم‌پوشانی داشته باشند
+    header, *lines = data.decode("utf-8").splitlines(keepends=True)
+    return [(f"part{i}.csv", "".join([header] + lines[start:end]).encode("utf-8"))
+            for i, (start, end) in enumerate(ranges)]
+
+
+def test_pool_cleans_like_a_single_pass(raw_csv):
+    files = split_csv(raw_csv, [(0, 30), (20, 45), (45, 60)])
+    results = {name: result for name, result, error in process_files(clean_file, files, 0, max_workers=2)}
+    assert sorted(results) == ["part0.csv", "part1.csv", "part2.csv"]
+    assert sum(raw_rows for raw_rows, _ in results.values()) == 70
+
+    merged, duplicates = merge_by_user_service_id(df for _, df in results.values())
+    assert duplicates == 10
+    expected = clean_frame(read_export(io.BytesIO(raw_csv)), 0)
+    pd.testing.assert_frame_equal(
+        merged.astype(str), expected.sort_values('UserServiceId').reset_index(drop=True).astype(str)
+    )
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_failed_file_is_reported_without_stopping_others(raw_csv, max_workers):
+    files = split_csv(raw_csv, [(0, 10)]) + [("broken.csv", b"")]
+    outcome = {name: (result is None, error is not None)
+               for name, result, error in process_files(clean_file, files, 0, max_workers=max_workers)}
+    assert outcome == {"part0.csv": (False, False), "broken.csv": (True, True)}
+
+
+def test_merge_keeps_rows_without_user_service_id():
+    first = pd.DataFrame({"UserServiceId": [3.0, None, 1.0], "Creator": ["c", "x", "a"]})
+    second = pd.DataFrame({"UserServiceId": [1.0, None, 2.0], "Creator": ["a", "y", "b"]})
+    merged, duplicates = merge_by_user_service_id([first, pd.DataFrame(), second])
+    assert duplicates == 1
+    assert merged["Creator"].tolist() == ["a", "b", "c", "x", "y"]
+    assert merge_by_user_service_id([])[1] == 0
@@ -0,0 +1,52 @@
+import datetime
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from hsp_parquet import PARQUET_COMPRESSION, to_arrow_table, write_parquet
+from hsp_schema import NEW_COLUMNS, arrow_schema
+
+
+def cleaned_frame():
+    # مثل خروجی clean_frame: تاریخ متنی، شناسه float به‌خاطر NaN، ستون‌های category و خالی
+    return pd.DataFrame({
+        "CreatDate": ["2024-03-20", None],
+        "UserServiceId": [12.0, np.nan],
+        "Creator": pd.Categorical(["ali", None]),
+        "ServiceName": pd.Categorical(["s1", "s2"]),
+        "Username": ["u1", np.nan],
+        "ServiceStatus": pd.Categorical(["active", "active"]),
+        "ServicePrice": np.nan,
+        "Package": ["1.5", None],
+        "StartDate": ["2024-03-20 10:00", ""],
+    })
+
+
+def test_to_arrow_table_follows_schema():
+    table = to_arrow_table(cleaned_frame())
+    assert table.schema == arrow_schema()
+    assert table.column_names == NEW_COLUMNS
+    assert table.to_pydict() == {
+        "CreatDate": [datetime.date(2024, 3, 20), None],
+        "UserServiceId": [12, None],
+        "Creator": ["ali", None],
+        "ServiceName": ["s1", "s2"],
+        "Username": ["u1", None],
+        "ServiceStatus": ["active", "active"],
+        "ServicePrice": [None, None],
+        "Package": [1.5, None],
+        "StartDate": ["2024-03-20 10:00", ""],
+        # ستونی که در DataFrame نیست تماماً null است
+        "EndDate": [None, None],
+    }
+
+
+def test_write_parquet_is_compressed_and_typed():
+    buffer = io.BytesIO()
+    write_parquet(cleaned_frame(), buffer)
+    buffer.seek(0)
+    parquet = pq.ParquetFile(buffer)
+    assert parquet.schema_arrow == arrow_schema()
+    assert parquet.metadata.row_group(0).column(0).compression == PARQUET_COMPRESSION.upper()
@@ -0,0 +1,59 @@
+import pstats
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit")
+
+from benchmarks.synthetic import write_raw_csv
+from hsp_clean import clean_frame, clean_stages
+from hsp_profile import NULL_PROFILER, StageProfiler, make_profiler
+from hsp_reader import read_export
+
+
+@pytest.fixture
+def df_raw(tmp_path):
+    path = tmp_path / "raw.csv"
+    write_raw_csv(50, str(path), seed=1)
+    return read_export(str(path))
+
+
+def test_profiled_clean_matches_clean_frame(df_raw):
+    profiler = StageProfiler()
+    result = profiler.clean_frame(df_raw.copy(), 0)
+    pd.testing.assert_frame_equal(result, clean_frame(df_raw.copy(), 0))
+
+    summary = profiler.summary()
+    assert summary["stage"].tolist() == [name for name, _ in clean_stages(0)]
+    assert (summary["calls"] == 1).all()
+    assert summary["rows_in"].iloc[0] == 50 and summary["rows_out"].iloc[-1] == len(result)
+    assert summary["wall_pct"].sum() == pytest.approx(100, abs=0.1)
+
+
+def test_repeated_stages_are_summed():
+    profiler = StageProfiler()
+    chunks = [pd.DataFrame({"a": range(n)}) for n in (3, 4)]
+    for chunk in profiler.iterate("read", chunks):
+        profiler.run("double", lambda df: pd.concat([df, df]), chunk)
+    summary = profiler.summary().set_index("stage")
+    # خواندن تکه‌ها یک next() اضافه برای پایان دارد
+    assert summary.loc["read", "calls"] == 3 and summary.loc["read", "rows_out"] == 7
+    assert summary.loc["double", "calls"] == 2
+    assert (summary.loc["double", "rows_in"], summary.loc["double", "rows_out"]) == (7, 14)
+
+
+def test_cprofile_output_is_written(tmp_path):
+    path = tmp_path / "stages.prof"
+    profiler = StageProfiler(str(path))
+    profiler.run("sum", lambda df: df.sum(), pd.DataFrame({"a": [1, 2]}))
+    profiler.dump()
+    assert pstats.Stats(str(path)).total_calls > 0
+
+
+def test_disabled_profiler_only_runs_stages(df_raw):
+    profiler = make_profiler(enabled=False)
+    assert profiler is NULL_PROFILER
+    assert list(profiler.iterate("read", [1, 2])) == [1, 2]
+    assert profiler.run("len", len, [1, 2, 3]) == 3
+    assert len(profiler.clean_frame(df_raw.copy(), 0)) == len(clean_frame(df_raw.copy(), 0))
+    assert profiler.summary().empty and not profiler.records
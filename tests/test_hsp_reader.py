@@ -0,0 +1,92 @@
+import io
+
+import pandas as pd
+import pytest
+
+import hsp_reader
+from hsp_reader import iter_export_chunks, read_export, rows_through_user_service_id
+from hsp_schema import COLUMNS_TO_DROP, EMPTY_RAW_COLUMNS, RAW_DTYPES
+
+CSV = (
+    "UserServiceId,Creator,ServiceName,Username,ServiceStatus,ServicePrice,PayPlan,SavingOffUsed,CDT,StartDate,EndDate\n"
+    "5,ali,10GB,007,Active,1000.0,PrePaid,10.0,1402/07/11 00:59:00,2023-10-03 00:00:00,2023-11-02\n"
+    "6,zahra,20GB,NULL,Active,2000.0,PrePaid,20.0,2024-03-28 13:02:49,,2024-04-27\n"
+    "7,,10GB,1.5,,,Installment,,2024-11-30,2024-11-30 00:00:00,\n"
+).encode("utf-8")
+
+
+@pytest.fixture(params=[True, False], ids=["arrow", "c"])
+def engine(request, monkeypatch):
+    monkeypatch.setattr(hsp_reader, "HAS_ARROW_CSV", request.param)
+
+
+def test_read_export_columns_and_dtypes(engine):
+    df = read_export(io.BytesIO(CSV))
+    assert list(df.columns) == [
+        "UserServiceId", "Creator", "ServiceName", "Username", "ServiceStatus", "ServicePrice",
+        "SavingOffUsed", "CDT", "StartDate", "EndDate",
+    ]
+    assert not set(COLUMNS_TO_DROP) & set(df.columns)
+    for col, kind in RAW_DTYPES.items():
+        if kind == "category":
+            assert isinstance(df[col].dtype, pd.CategoricalDtype), col
+        else:
+            assert df[col].dtype == pd.Series([], dtype=kind).dtype, col
+    assert pd.api.types.is_integer_dtype(df["UserServiceId"])
+    # متن شبیه عدد همان متن می‌ماند و مقادیر خالی NA هستند
+    assert df["Username"].tolist()[0::2] == ["007", "1.5"]
+    assert df["Username"].isna().tolist() == [False, True, False]
+    assert df["Creator"].isna().tolist() == [False, False, True]
+    assert df["CDT"].tolist()[1] == "2024-03-28 13:02:49"
+    assert df["UserServiceId"].tolist() == [5, 6, 7]
+    for col in EMPTY_RAW_COLUMNS:
+        assert df[col].isna().all()
+
+
+def test_keep_empty_columns_reads_their_values(engine):
+    df = read_export(io.BytesIO(CSV), keep_empty_columns=True)
+    assert df["ServicePrice"].tolist()[:2] == [1000.0, 2000.0]
+    assert df["SavingOffUsed"].tolist()[:2] == [10.0, 20.0]
+
+
+def test_engines_agree_and_file_position_is_respected(monkeypatch):
+    source = io.BytesIO(b"junk\n" + CSV)
+    source.readline()
+    arrow = read_export(source)
+    monkeypatch.setattr(hsp_reader, "HAS_ARROW_CSV", False)
+    source.seek(5)
+    pd.testing.assert_frame_equal(arrow, read_export(source))
+
+
+def id_csv(ids):
+    return io.BytesIO(("UserServiceId,Creator\n" + "".join(f"{i},c\n" for i in ids)).encode("utf-8"))
+
+
+@pytest.mark.parametrize("chunksize", [2, 3, 100])
+@pytest.mark.parametrize("ids, user_service_id, expected", [
+    ([1, 2, 3, 4, 5, 6, 7], 4, 4),
+    ([1, 2, 3, 4, 5, 6, 7], 0, 0),
+    ([1, 2, 3, 4, 5, 6, 7], 9, 7),
+    ([1, 2, 2, 4, 5, 6, 7], 2, 3),
+    # نامرتب: فقط ردیف‌های ابتدایی تا اولین تکه‌ای که ردیف بزرگ‌تر دارد شمرده می‌شوند
+    ([1, 2, 9, 3, 4, 5, 6], 4, None),
+])
+def test_rows_through_user_service_id(engine, chunksize, ids, user_service_id, expected):
+    source = id_csv(ids)
+    skipped = rows_through_user_service_id(source, user_service_id, chunksize)
+    assert source.tell() == 0
+    leading = next((i for i, value in enumerate(ids) if value > user_service_id), len(ids))
+    if expected is None:
+        # بدون مرتب بودن، شمارش محافظه‌کارانه است و هیچ‌وقت از ردیف‌های ابتدایی جلوتر نمی‌رود
+        assert skipped <= leading
+    else:
+        assert skipped == leading == expected
+
+
+def test_export_chunks_skip_leading_rows():
+    full = read_export(io.BytesIO(CSV))
+    chunks = list(iter_export_chunks(io.BytesIO(CSV), chunksize=1, skip_rows=1))
+    assert len(chunks) == 2
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks, ignore_index=True).astype(str), full.iloc[1:].reset_index(drop=True).astype(str)
+    )
@@ -0,0 +1,38 @@
+import datetime
+
+import jdatetime
+import numpy as np
+import pandas as pd
+
+from jalali_dates import convert_jalali_series, to_gregorian_if_jalali
+
+
+def expected(values):
+    return [to_gregorian_if_jalali(v) for v in values]
+
+
+def test_matches_row_by_row_conversion_on_edge_cases():
+    values = [
+        "1402/01/01", "1402-1-1", "1403/12/30", "1402/12/30", "1402/13/01", "1402/00/10", "1402/07/31",
+        "1499/12/29", "14000/01/01", "1401/1", "2024/02/29", "2023/02/29", "2024-12-31", "2024/13/01",
+        "20240101", "۱۴۰۲/۰۱/۰۱", "1990/01/01", "", "14", None, np.nan, 14020101, "1402/01/01",
+    ]
+    result = convert_jalali_series(pd.Series(values, dtype=object))
+    pd.testing.assert_series_equal(result, pd.Series(expected(values), dtype=object))
+    assert result.iloc[0] == "2023-03-21"
+
+
+def test_matches_row_by_row_conversion_on_every_day():
+    start = jdatetime.date(1399, 1, 1)
+    jalali = [(start + datetime.timedelta(days=i)).strftime("%Y/%m/%d") for i in range(1500)]
+    gregorian = [(datetime.date(2019, 1, 1) + datetime.timedelta(days=i)).strftime("%Y-%m-%d") for i in range(1500)]
+    values = pd.Series(jalali + gregorian, dtype=object)
+    assert convert_jalali_series(values).tolist() == expected(values)
+
+
+def test_keeps_index_and_name():
+    dates = pd.Series(["1402/01/01", None], index=[10, 20], name="CreatDate", dtype=object)
+    result = convert_jalali_series(dates)
+    assert result.index.tolist() == [10, 20]
+    assert result.name == "CreatDate"
+    assert convert_jalali_series(pd.Series([], dtype=object)).empty
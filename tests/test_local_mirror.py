@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("duckdb")
+
+import local_mirror
+from conftest import TABLE_PATH, SourceTable, make_rows, to_arrow
+
+
+class BatchedSource(SourceTable):
+    # مثل BigQueryBackend.query_arrow_batches: نتیجه در صفحه‌های page_size ردیفی
+
+    def __init__(self, table, page_size):
+        super().__init__(table)
+        self.page_size = page_size
+        self.requested = []
+
+    def query_arrow(self, query, params=()):
+        raise AssertionError("sync_table باید نتیجه را صفحه‌به‌صفحه بخواند")
+
+    def query_arrow_batches(self, query, params=(), page_size=None):
+        self.requested.append(page_size)
+        return super().query_arrow(query, params).to_batches(max_chunksize=self.page_size)
+
+
+def count(mirror):
+    return mirror.query_arrow(f"SELECT COUNT(*) AS n FROM {TABLE_PATH}").column("n")[0].as_py()
+
+
+def test_sync_writes_in_batches(tmp_path):
+    source = BatchedSource(to_arrow(make_rows(list(range(1, 101)))), page_size=7)
+    assert local_mirror.sync_table(source, "hspdata", str(tmp_path), file_rows=30) == 100
+    assert source.requested == [30]
+    # صفحه‌های ۷ ردیفی تا رسیدن به ۳۰ ردیف جمع و با هم نوشته می‌شوند: ۳۵ + ۳۵ + ۳۰
+    assert len(list(local_mirror._part_files(str(tmp_path), "hspdata"))) == 3
+    assert local_mirror.read_state(str(tmp_path), "hspdata")["max_usv"] == 100
+    assert count(local_mirror.MirrorBackend(str(tmp_path))) == 100
+
+
+def test_resync_only_reads_new_rows(tmp_path):
+    table = to_arrow(make_rows(list(range(1, 51))))
+    local_mirror.sync_table(SourceTable(table.slice(0, 20)), "hspdata", str(tmp_path))
+    assert local_mirror.sync_table(SourceTable(table), "hspdata", str(tmp_path)) == 30
+    assert local_mirror.sync_table(SourceTable(table), "hspdata", str(tmp_path)) == 0
+    assert local_mirror.read_state(str(tmp_path), "hspdata") | {"synced_at": None} == {
+        "max_usv": 50, "rows": 50, "synced_at": None
+    }
+
+
+def test_backend_sees_tables_synced_after_it_started(tmp_path):
+    mirror = local_mirror.MirrorBackend(str(tmp_path))
+    assert count(mirror) == 0
+    local_mirror.sync_table(SourceTable(to_arrow(make_rows([1, 2, 3]))), "hspdata", str(tmp_path))
+    assert count(mirror) == 3
@@ -0,0 +1,76 @@
+import re
+import zlib
+
+import pandas as pd
+
+import pdf_export
+from pdf_export import TOTAL_FILL, render_pdf
+
+
+def page_contents(pdf_bytes):
+    streams = re.findall(rb"/Length \d+>>\nstream\n(.*?)\nendstream", pdf_bytes, re.S)
+    return [zlib.decompress(stream).decode("latin-1") for stream in streams]
+
+
+def row_fills(content):
+    # رنگ پس‌زمینه هر سلول متن‌دار، به ترتیب نوشته شدن
+    fills, current = [], None
+    for fill, text in re.findall(r"([\d.]+ [\d.]+ [\d.]+ rg)|\((.*?)\) Tj", content):
+        if fill:
+            current = fill
+        else:
+            fills.append((text, current))
+    return fills
+
+
+def rg(color):
+    return "%.3f %.3f %.3f rg" % tuple(c / 255 for c in color)
+
+
+def pivot_frame():
+    return pd.DataFrame({
+        "Creator": ["ali", "ali - Total", "zahra", "Grand Total"],
+        "ServiceName": ["s1", "", "s2", ""],
+        "UserServiceId_count": [2, 2, 1, 3],
+        "Package_sum": [3.0, 3.0, None, 3.0],
+    })
+
+
+def highlighted(pdf_bytes):
+    # متن سلول‌های داده (بدون سرستون) و اینکه با رنگ ردیف جمع کشیده شده‌اند یا نه؛ سلول خالی متنی ندارد
+    cells = row_fills(page_contents(pdf_bytes)[0])[4:]
+    return [(text, fill == rg(TOTAL_FILL)) for text, fill in cells]
+
+
+def test_totals_are_highlighted_by_name_or_flags():
+    assert highlighted(render_pdf(pivot_frame())) == [
+        ("ali", False), ("s1", False), ("2", False), ("3.0", False),
+        ("ali - Total", True), ("2", True), ("3.0", True),
+        ("zahra", False), ("s2", False), ("1", False), ("nan", False),
+        ("Grand Total", True), ("3", True), ("3.0", True),
+    ]
+    flagged = highlighted(render_pdf(pivot_frame(), total_rows=[True, False, False, False]))
+    assert [text for text, is_total in flagged if is_total] == ["ali", "s1", "2", "3.0"]
+
+
+def test_fast_rows_match_fpdf_cells(monkeypatch):
+    df = pd.DataFrame({"Creator": [f"c{i}" for i in range(300)], "Package": [i / 4 for i in range(300)]})
+    fast = page_contents(render_pdf(df))
+
+    init = pdf_export.TablePDF.__init__
+
+    def slow_init(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        self.fast_rows = False
+
+    monkeypatch.setattr(pdf_export.TablePDF, "__init__", slow_init)
+    slow = page_contents(render_pdf(df))
+    assert len(fast) > 1
+    assert fast == slow
+    texts = [text for content in fast for text, _ in row_fills(content)]
+    assert texts.count("Creator") == len(fast)
+    assert [text for text in texts if text.startswith("c")] == [f"c{i}" for i in range(300)]
+
+
+def test_empty_frame_renders_nothing():
+    assert render_pdf(pd.DataFrame()) == b""
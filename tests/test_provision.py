@@ -0,0 +1,52 @@
+import datetime
+
+import pytest
+
+import hsp_provision
+from hsp_provision import TableInfo, format_plan, plan_table
+from hsp_schema import HSP_SCHEMA
+
+TABLE_PATH = "frsphotspots.HSP.hspdata"
+
+
+def test_offline_plan_rebuilds_every_table(monkeypatch, capsys):
+    monkeypatch.setattr("sys.argv", ["hsp_provision", "--offline", "--tables", "hspdata"])
+    hsp_provision.main()
+    out = capsys.readouterr().out
+    suffix = datetime.date.today().strftime("%Y%m%d")
+    assert out.startswith(f"-- {TABLE_PATH}: rebuild\n")
+    assert "بارگذاری در این جدول" in out
+    assert f"CREATE TABLE `{TABLE_PATH}__partitioned`\nPARTITION BY CreatDate\nCLUSTER BY Creator, UserServiceId" in out
+    assert f"ASSERT (SELECT COUNT(*) FROM `{TABLE_PATH}`) = copied_rows" in out
+    assert f"ALTER TABLE `{TABLE_PATH}` RENAME TO `hspdata__backup_{suffix}`;" in out
+    assert f"ALTER TABLE `frsphotspots.HSP.hspdata__backup_{suffix}` RENAME TO `hspdata`;" in out
+    assert f"FROM `frsphotspots.HSP.hspdata__backup_{suffix}`\nWHERE UserServiceId > copied_usv;" in out
+    # CTAS قبل از جابه‌جایی و کپی ردیف‌های جامانده بعد از آن
+    assert out.index("AS SELECT") < out.index("RENAME TO") < out.index("INSERT INTO")
+
+
+def test_plan_refuses_rebuild_with_extra_columns():
+    columns = tuple(name for name, _ in HSP_SCHEMA) + ("Region",)
+    plan = plan_table(TableInfo(TABLE_PATH, columns=columns), "20240101")
+    assert plan.action == "blocked"
+    assert plan.statements == []
+    assert "Region" in format_plan(plan)
+
+
+@pytest.mark.parametrize("info, action", [
+    (TableInfo(TABLE_PATH, exists=False), "create"),
+    (TableInfo(TABLE_PATH, partition_field="CreatDate", cluster_fields=("Creator", "UserServiceId")), "ok"),
+    (TableInfo(TABLE_PATH, columns=tuple(name for name, _ in HSP_SCHEMA)), "rebuild"),
+])
+def test_plan_action(info, action):
+    assert plan_table(info, "20240101").action == action
+
+
+def test_plan_estimates_window_scan():
+    info = TableInfo(
+        TABLE_PATH, num_bytes=300 * 2**30,
+        first_date=datetime.date(2024, 1, 1), last_date=datetime.date(2024, 12, 25),
+    )
+    plan = plan_table(info, "20240101", window_days=36)
+    assert plan.window_scan_bytes == 30 * 2**30
+    assert "(90% کمتر)" in format_plan(plan, window_days=36)
@@ -0,0 +1,119 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+from google.api_core.exceptions import NotFound
+
+import local_mirror
+from conftest import TABLE_PATH, SourceTable, make_rows, to_arrow
+from report_queries import (
+    ReportFilters, fetch_page, iter_pages, iter_pages_with_progress, next_cursor, open_rows,
+)
+
+KEY = ["UserServiceId", "Username", "CreatDate"]
+
+
+class FullTable(SourceTable):
+    # همگام‌سازی افزایشی ردیف‌های بدون شناسه را نمی‌آورد؛ اینجا همه ردیف‌ها یک‌جا نوشته می‌شوند
+
+    def query_arrow(self, query, params=()):
+        return self.table
+
+
+def make_mirror(tmp_path, rows):
+    local_mirror.sync_table(FullTable(to_arrow(rows)), "hspdata", str(tmp_path))
+    return local_mirror.MirrorBackend(str(tmp_path))
+
+
+@pytest.fixture
+def rows():
+    # شناسه‌های تکراری در مرز صفحه‌ها، ردیف‌های کاملاً تکراری (آپلود تکراری)، شناسه خالی و
+    # Username خالی در کنار Username برابر ''
+    n = 40
+    ids = [None if i % 9 == 0 else i // 3 for i in range(n)]
+    usernames = [None if i % 7 == 0 else "" if i % 7 == 1 else f"u{i % 2}" for i in range(n)]
+    dates = [None if i % 13 == 5 else datetime.date(2024, 1, 1 + i % 2) for i in range(n)]
+    df = make_rows(ids, usernames, dates)
+    return pd.concat([df, df.iloc[10:16]], ignore_index=True)
+
+
+def keys(df):
+    return sorted(
+        tuple("<NA>" if pd.isna(value) else repr(value) for value in row)
+        for row in df[KEY].itertuples(index=False)
+    )
+
+
+def read_all_pages(client, filters, page_size):
+    result = open_rows(client, filters)
+    pages, cursor = [], 0
+    while cursor is not None:
+        page = fetch_page(client, result, cursor, page_size=page_size)
+        pages.append(page)
+        cursor = next_cursor(page, page_size, cursor)
+    return pd.concat(pages, ignore_index=True)
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 3, 7, 100])
+def test_pages_cover_every_row_once(tmp_path, rows, page_size):
+    got = read_all_pages(make_mirror(tmp_path, rows), ReportFilters.create(TABLE_PATH, ["a"]), page_size)
+    assert len(got) == len(rows)
+    assert keys(got) == keys(rows)
+    # ردیف‌های بدون شناسه در انتها می‌آیند
+    null_ids = rows["UserServiceId"].isna().sum()
+    assert got["UserServiceId"].isna().iloc[-null_ids:].all()
+
+
+def test_pages_keep_rows_with_identical_keys(tmp_path):
+    rows = make_rows([1, 2, 2, 3, 4, 4, 5, 6], usernames=["u"] * 8, dates=[datetime.date(2024, 1, 1)] * 8)
+    got = read_all_pages(make_mirror(tmp_path, rows), ReportFilters.create(TABLE_PATH, ["a"]), 2)
+    assert got["UserServiceId"].tolist() == [1, 2, 2, 3, 4, 4, 5, 6]
+
+
+def test_pages_read_from_one_result(tmp_path, rows):
+    mirror = make_mirror(tmp_path, rows)
+    filters = ReportFilters.create(TABLE_PATH, ["a"])
+    result = open_rows(mirror, filters)
+    first = fetch_page(mirror, result, 0, page_size=5)
+    # همگام‌سازی بعدی روی صفحه‌های همان نتیجه اثری ندارد
+    more = make_rows([1000, 1001])
+    local_mirror.sync_table(SourceTable(to_arrow(more)), "hspdata", str(tmp_path))
+    assert fetch_page(mirror, result, 0, page_size=5).equals(first)
+    assert len(read_all_pages(mirror, filters, 7)) == len(rows) + 2
+
+
+def test_dropped_result_raises_not_found(tmp_path, rows, monkeypatch):
+    monkeypatch.setattr(local_mirror, "MAX_OPEN_RESULTS", 1)
+    mirror = make_mirror(tmp_path, rows)
+    filters = ReportFilters.create(TABLE_PATH, ["a"])
+    old = open_rows(mirror, filters)
+    open_rows(mirror, filters)
+    with pytest.raises(NotFound):
+        fetch_page(mirror, old, 0)
+
+
+def test_backend_without_results_pages_in_memory(tmp_path, rows):
+    mirror = make_mirror(tmp_path, rows)
+
+    class QueryOnly:
+        def query_arrow(self, query, params=()):
+            return mirror.query_arrow(query, params)
+
+    got = read_all_pages(QueryOnly(), ReportFilters.create(TABLE_PATH, ["a"]), 4)
+    assert keys(got) == keys(rows)
+
+
+def test_export_reads_one_query_in_pages(tmp_path, rows):
+    pages = list(iter_pages(make_mirror(tmp_path, rows), ReportFilters.create(TABLE_PATH, ["a"]), page_size=6))
+    assert len(pages) > 1
+    assert keys(pd.concat(pages)) == keys(rows)
+
+
+def test_export_progress_counts_rows_without_id(tmp_path, rows):
+    reported = []
+    filters = ReportFilters.create(TABLE_PATH, ["a"])
+    list(iter_pages_with_progress(make_mirror(tmp_path, rows), filters, reported.append, page_size=6))
+    assert reported[-1] == pytest.approx(1.0)
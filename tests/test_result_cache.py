@@ -0,0 +1,157 @@
+import threading
+import time
+import types
+
+import pandas as pd
+
+import pdf_export
+import report_queries
+import result_cache
+from conftest import TABLE_PATH
+from report_queries import ReportFilters
+from result_cache import ResultCache, SingleFlight
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def fake_clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_evicts_least_recently_used_by_size():
+    cache = ResultCache(max_bytes=250)
+    cache.put("a", b"x" * 100)
+    cache.put("b", b"x" * 100)
+    assert cache.get("a") is not None
+    cache.put("c", b"x" * 100)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 200
+    # مقداری بزرگ‌تر از کل کش ذخیره نمی‌شود و بقیه را بیرون نمی‌اندازد
+    cache.put("big", b"x" * 300)
+    assert cache.get("big") is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = fake_clock(monkeypatch)
+    cache = ResultCache(ttl=60)
+    cache.put("a", b"value")
+    clock.now += 59
+    assert cache.get("a") == b"value"
+    clock.now += 1
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_watermark_change_invalidates_entry():
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return pd.DataFrame({"n": [len(calls)]})
+
+    assert cache.get_or_compute("k", compute, watermark=5)["n"].iloc[0] == 1
+    assert cache.get_or_compute("k", compute, watermark=5)["n"].iloc[0] == 1
+    assert cache.get_or_compute("k", compute, watermark=6)["n"].iloc[0] == 2
+    assert cache.get("k", watermark=5) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_filters_are_normalized_into_one_cache_key():
+    first = ReportFilters.create(TABLE_PATH, ["b", "a", "b"], "=", ["7"], None, ["ignored"])
+    second = ReportFilters.create(TABLE_PATH, ["a", "b"], "=", (7,))
+    assert first == second and hash(first) == hash(second)
+    assert first.date_values == ()
+
+
+def test_cached_report_reruns_query_only_after_watermark_moves(monkeypatch):
+    watermark = [10]
+    monkeypatch.setattr(report_queries, "_current_watermark", lambda client, table_path: watermark[0])
+    queries = []
+
+    def fetch(client, query, params):
+        queries.append(query)
+        return pd.DataFrame({"n": [len(queries)]})
+
+    monkeypatch.setattr(report_queries, "fetch_dataframe", fetch)
+    filters = ReportFilters.create(TABLE_PATH, ["a"])
+    for _ in range(3):
+        assert report_queries.cached_report(None, "summary", filters, "SELECT 1", [])["n"].iloc[0] == 1
+    watermark[0] = 11
+    assert report_queries.cached_report(None, "summary", filters, "SELECT 1", [])["n"].iloc[0] == 2
+
+
+def run_concurrently(func, count):
+    # همه نخ‌ها هم‌زمان شروع می‌کنند؛ نتیجه یا خطای هر نخ برمی‌گردد
+    barrier = threading.Barrier(count)
+    outcomes = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        try:
+            outcomes[i] = func()
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def slow_compute(calls, value=None, error=None):
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        if error:
+            raise error
+        return value
+    return compute
+
+
+def test_single_flight_runs_concurrent_calls_once():
+    flight, calls = SingleFlight(), []
+    outcomes = run_concurrently(lambda: flight.do("k", slow_compute(calls, value="v")), 8)
+    assert outcomes == ["v"] * 8
+    assert len(calls) == 1 and flight.shared == 7
+    # بعد از پایان اجرا کلید آزاد است و فراخوانی بعدی دوباره اجرا می‌شود
+    assert flight.do("k", slow_compute(calls, value="w")) == "w"
+
+
+def test_single_flight_shares_errors_without_caching_them():
+    cache, calls = ResultCache(), []
+    error = RuntimeError("job failed")
+    outcomes = run_concurrently(lambda: cache.get_or_compute("k", slow_compute(calls, error=error)), 5)
+    assert all(outcome is error for outcome in outcomes)
+    assert len(calls) == 1
+    assert cache.get_or_compute("k", lambda: b"ok") == b"ok"
+
+
+def test_concurrent_reports_share_one_query_per_watermark():
+    cache, calls = ResultCache(), []
+    outcomes = run_concurrently(lambda: cache.get_or_compute("k", slow_compute(calls, value=b"v"), watermark=1), 6)
+    assert outcomes == [b"v"] * 6 and len(calls) == 1
+    assert cache.stats()["shared_in_flight"] == 5
+
+
+def test_identical_pdfs_are_rendered_once(monkeypatch):
+    monkeypatch.setattr(pdf_export, "pdf_cache", ResultCache())
+    calls = []
+    monkeypatch.setattr(pdf_export, "render_pdf", lambda df, total_rows=None: calls.append(1) or b"pdf")
+    frame = pd.DataFrame({"Creator": ["a", "Grand Total"], "n": [1, 1]})
+    assert pdf_export.render_pdf_shared(frame) == pdf_export.render_pdf_shared(frame.copy()) == b"pdf"
+    pdf_export.render_pdf_shared(frame, total_rows=[False, False])
+    assert len(calls) == 2
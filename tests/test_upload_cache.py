@@ -0,0 +1,78 @@
+import io
+
+import pytest
+
+import upload_cache
+from benchmarks.synthetic import write_raw_csv
+from hsp_parallel import clean_file
+from result_cache import ResultCache
+
+
+class UploadedFile(io.BytesIO):
+    # مثل UploadedFile استریم‌لیت: محتوا، نام و file_id
+    def __init__(self, data, name, file_id):
+        super().__init__(data)
+        self.name, self.file_id = name, file_id
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(upload_cache, "upload_cache", ResultCache())
+    monkeypatch.setattr(upload_cache, "_hashes", upload_cache.OrderedDict())
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    path = tmp_path / "raw.csv"
+    write_raw_csv(40, str(path), seed=2)
+    return path.read_bytes()
+
+
+class Counting:
+    def __init__(self, func):
+        self.func, self.calls = func, 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.func(*args, **kwargs)
+
+
+def test_content_hash_is_remembered_per_file_id(monkeypatch, raw_csv):
+    sha = Counting(upload_cache.file_sha256)
+    monkeypatch.setattr(upload_cache, "file_sha256", sha)
+    first = UploadedFile(raw_csv, "a.csv", "id-1")
+    assert upload_cache.content_hash(first) == upload_cache.content_hash(first)
+    assert sha.calls == 1
+    assert upload_cache.content_hash(UploadedFile(raw_csv, "b.csv", "id-2")) == upload_cache.content_hash(first)
+    assert sha.calls == 2
+
+
+def test_same_content_is_read_and_cleaned_once(raw_csv):
+    read = Counting(upload_cache.hsp_reader.read_export)
+    clean = Counting(upload_cache.hsp_clean.clean_frame)
+    first = upload_cache.cached_clean_export(UploadedFile(raw_csv, "a.csv", "id-1"), 0, read, clean)
+    again = upload_cache.cached_clean_export(UploadedFile(raw_csv, "copy.csv", "id-2"), 0, read, clean)
+    assert again is first
+    assert (read.calls, clean.calls) == (1, 1)
+
+    # watermark جدول جلو رفته: فقط پاک‌سازی دوباره اجرا می‌شود، نه خواندن فایل
+    max_usv = int(first["UserServiceId"].iloc[19])
+    newer = upload_cache.cached_clean_export(UploadedFile(raw_csv, "a.csv", "id-1"), max_usv, read, clean)
+    assert (read.calls, clean.calls) == (1, 2)
+    assert len(newer) == len(first) - 20
+
+
+def test_process_uploads_only_sends_uncached_files(raw_csv):
+    files = [UploadedFile(raw_csv, "a.csv", "id-1"), UploadedFile(raw_csv[:2000], "b.csv", "id-2")]
+    first = {name: result for name, result, error in upload_cache.process_uploads(clean_file, files, 0)}
+    assert sorted(first) == ["a.csv", "b.csv"]
+
+    worker = Counting(clean_file)
+    worker.__name__ = clean_file.__name__
+    again = {name: result for name, result, error in upload_cache.process_uploads(worker, files, 0)}
+    assert worker.calls == 0
+    assert all(again[name] is first[name] for name in first)
+
+    # با args دیگر (watermark دیگر) نتیجه کش‌شده استفاده نمی‌شود
+    list(upload_cache.process_uploads(worker, files[:1], 10))
+    assert worker.calls == 1
@@ -0,0 +1,92 @@
+import hashlib
+import inspect
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import hsp_clean
+import hsp_reader
+import hsp_schema
+import jalali_dates
+from hsp_ingest import file_sha256
+from hsp_parallel import process_files
+from result_cache import ResultCache
+
+# فایل‌های خوانده و پاک‌سازی‌شده، مشترک بین rerunها و سشن‌ها؛ کلید هش محتوای فایل است
+UPLOAD_CACHE_MAX_BYTES = 1024 * 2**20
+UPLOAD_CACHE_TTL_SECONDS = 60 * 60
+
+upload_cache = ResultCache(max_bytes=UPLOAD_CACHE_MAX_BYTES, ttl=UPLOAD_CACHE_TTL_SECONDS)
+
+# نسخه مسیر خواندن / پاک‌سازی: هش کد همین ماژول‌ها، تا با هر تغییر کد نتیجه کش‌شده قدیمی استفاده نشود
+PIPELINE_VERSION = hashlib.sha1(
+    "".join(inspect.getsource(module) for module in (hsp_reader, hsp_clean, hsp_schema, jalali_dates)).encode("utf-8")
+).hexdigest()[:12]
+
+# hash فایل‌های آپلودی بر اساس file_id استریم‌لیت، تا در هر rerun کل فایل دوباره hash نشود
+_MAX_HASHES = 256
+_hashes = OrderedDict()
+_hashes_lock = threading.Lock()
+
+
+def content_hash(file_obj):
+    file_id = getattr(file_obj, "file_id", None)
+    if file_id is not None:
+        with _hashes_lock:
+            if file_id in _hashes:
+                return _hashes[file_id]
+    digest = file_sha256(file_obj)
+    if file_id is not None:
+        with _hashes_lock:
+            _hashes[file_id] = digest
+            while len(_hashes) > _MAX_HASHES:
+                _hashes.popitem(last=False)
+    return digest
+
+
+def _rewound(file_obj):
+    file_obj.seek(0)
+    return file_obj
+
+
+def cached_read_export(file_obj, read=hsp_reader.read_export):
+    # DataFrame خام فایل (خروجی read_export)؛ read برای زمان‌سنجی قابل جایگزینی است
+    key = ("raw", content_hash(file_obj), PIPELINE_VERSION)
+    return upload_cache.get_or_compute(key, lambda: read(_rewound(file_obj)))
+
+
+def cached_clean_export(file_obj, max_usv, read=hsp_reader.read_export, clean=hsp_clean.clean_frame):
+    # DataFrame پاک‌شده فایل برای max_usv داده‌شده؛ با تغییر watermark جدول دوباره ساخته می‌شود
+    key = ("clean", content_hash(file_obj), PIPELINE_VERSION)
+    return upload_cache.get_or_compute(
+        key, lambda: clean(cached_read_export(file_obj, read), max_usv), watermark=max_usv
+    )
+
+
+def cached_clean_preview(file_obj, max_usv, rows=100):
+    # ردیف‌های اول تکه اول پاک‌شده فایل، برای پیش‌نمایش حالت استریم
+    def build():
+        first_chunk = next(hsp_clean.iter_clean_chunks(_rewound(file_obj), max_usv), pd.DataFrame())
+        return first_chunk.head(rows).copy()
+
+    key = ("preview", content_hash(file_obj), PIPELINE_VERSION, rows)
+    return upload_cache.get_or_compute(key, build, watermark=max_usv)
+
+
+def process_uploads(worker, uploaded_files, *args):
+    # مثل hsp_parallel.process_files روی فایل‌های آپلودی؛ نتیجه هر فایل با هش محتوا و args کش
+    # می‌شود و فقط فایل‌هایی که در کش نیستند خوانده و به پروسه‌ها فرستاده می‌شوند
+    pending, keys = [], {}
+    for f in uploaded_files:
+        key = (worker.__name__, content_hash(f), PIPELINE_VERSION)
+        result = upload_cache.get(key, args)
+        if result is not None:
+            yield f.name, result, None
+        else:
+            keys[f.name] = key
+            pending.append((f.name, f.getvalue()))
+    for name, result, error in process_files(worker, pending, *args):
+        if error is None:
+            upload_cache.put(keys[name], result, args)
+        yield name, result, error